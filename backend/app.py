@@ -1,12 +1,34 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 import requests
+import csv
+import hashlib
+import io
 import json
+import math
 import uuid  # For generating unique message IDs
 import logging
+import threading
+import time
+from datetime import datetime, timezone
 from config import Config
-from pymongo import MongoClient, errors as pymongo_errors
+from dispatcher import Dispatcher
+from groupme import GroupMeClient
+from health import ChatHealthMonitor, DEAD_STATUS_CODES
+from history import GROUP_BY_FIELDS, MemoryBroadcastHistory, create_history_store, delivery_row
+from jobs import BroadcastJobStore, BroadcastJobRunner, BroadcastScheduler, JOB_QUEUED, JOB_RUNNING, JOB_SCHEDULED
+from ledger import SendLedger
+from plans import BroadcastPlanStore, group_map_from_rows
+from profiling import RequestProfiler
+from registry import BuildingRegistry
+from cache import ImageCache
+from compression import ResponseCompressor
+from metrics import Registry, timed, track_in_flight
+from mongo import MongoConnector, STATE_CONNECTED, STATE_DISABLED
+from templating import MessageTemplate
+from storage import INSERT_FAILED, DuplicateChatError, MemoryChatStore, create_chat_store
+from ratelimit import RateLimiter, RetryPolicy, RETRYABLE_STATUS_CODES, parse_retry_after
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -14,10 +36,84 @@ logging.basicConfig(level=logging.INFO)
 app = Flask(__name__)
 
 # Module-level defaults so module can be imported without side-effects
-GROUPME_API_URL = 'https://api.groupme.com/v3'
-buildings_data = []
-chats_collection = None
-_fallback_chats = []
+GROUPME_API_URL = Config.GROUPME_API_URL.rstrip('/')
+GROUPME_IMAGE_URL = Config.GROUPME_IMAGE_URL.rstrip('/')
+# Buildings from buildings.json with id/region indexes; loaded in init_app
+building_registry = BuildingRegistry(Config.BUILDINGS_FILE, reload_interval=Config.BUILDINGS_RELOAD_INTERVAL)
+# Chat storage backend (mongo, sqlite or in-memory fallback); chosen in init_app
+chat_store = MemoryChatStore()
+# Finished broadcasts and their per-group outcomes, on the same backend as chats
+broadcast_history = MemoryBroadcastHistory()
+# Bounded thread pool used to fan out GroupMe sends; resized from config in init_app
+send_dispatcher = Dispatcher(Config.SEND_MAX_IN_FLIGHT, name='groupme-send')
+# Separate pool for group joins during bulk chat imports
+join_dispatcher = Dispatcher(Config.BULK_JOIN_MAX_IN_FLIGHT, name='groupme-join')
+# Small pool and its own rate limiter for chat health sweeps, kept apart so a sweep never
+# takes send slots or send tokens from a broadcast
+health_dispatcher = Dispatcher(Config.CHAT_HEALTH_MAX_IN_FLIGHT, name='groupme-health')
+health_rate_limiter = RateLimiter(rate=Config.CHAT_HEALTH_RATE_LIMIT)
+# One pooled keep-alive HTTP client per process for all GroupMe API calls
+groupme_client = GroupMeClient(
+    pool_connections=Config.GROUPME_POOL_CONNECTIONS,
+    pool_maxsize=Config.GROUPME_POOL_MAXSIZE,
+    pool_block=Config.GROUPME_POOL_BLOCK,
+    timeout=Config.GROUPME_TIMEOUT,
+)
+# Global and per-group send rate limits, plus retry/backoff for transient send failures
+send_rate_limiter = RateLimiter(
+    rate=Config.GROUPME_RATE_LIMIT,
+    burst=Config.GROUPME_RATE_BURST,
+    group_rate=Config.GROUPME_GROUP_RATE_LIMIT,
+    group_burst=Config.GROUPME_GROUP_RATE_BURST,
+)
+send_retry_policy = RetryPolicy(
+    max_retries=Config.GROUPME_MAX_RETRIES,
+    base_delay=Config.GROUPME_BACKOFF_BASE,
+    max_delay=Config.GROUPME_BACKOFF_MAX,
+)
+# SHA-256 of uploaded image bytes -> GroupMe picture_url, so repeated images skip the upload
+image_cache = ImageCache(Config.IMAGE_CACHE_MAX_ENTRIES, ttl=Config.IMAGE_CACHE_TTL)
+broadcast_jobs = BroadcastJobStore()
+# gzip/brotli for JSON and text responses over COMPRESS_MIN_SIZE bytes
+response_compressor = ResponseCompressor(
+    Config.COMPRESS_MIN_SIZE, gzip_level=Config.COMPRESS_LEVEL, brotli_quality=Config.COMPRESS_BROTLI_QUALITY
+)
+# Per-request span/cProfile breakdowns, kept in a ring buffer for /api/debug/profiles
+request_profiler = RequestProfiler(
+    Config.PROFILE_BUFFER_SIZE, enabled=Config.PROFILE_REQUESTS, mode=Config.PROFILE_MODE
+)
+# Per-group delivery records for broadcasts sent with an idempotency key
+send_ledger = SendLedger(ttl=Config.SEND_LEDGER_TTL)
+# Recipient sets resolved by /api/messages/plan, reusable by the send endpoint via plan_token
+broadcast_plans = BroadcastPlanStore(ttl=Config.BROADCAST_PLAN_TTL)
+
+# Prometheus-style metrics served from /api/metrics (values are per worker process)
+metrics_registry = Registry()
+groupme_call_seconds = metrics_registry.histogram(
+    'rhac_groupme_call_seconds', 'Latency of GroupMe API helpers, including retries', ('endpoint', 'status'))
+storage_query_seconds = metrics_registry.histogram(
+    'rhac_storage_query_seconds', 'Latency of chat storage operations', ('backend', 'operation'))
+broadcast_fanout_groups = metrics_registry.histogram(
+    'rhac_broadcast_fanout_groups', 'Number of groups targeted per broadcast',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500))
+sends_in_flight = metrics_registry.gauge('rhac_groupme_sends_in_flight', 'GroupMe sends currently in progress')
+http_request_seconds = metrics_registry.histogram(
+    'rhac_http_request_seconds', 'Flask request latency per route', ('route', 'method', 'status'))
+groupme_connections = metrics_registry.gauge(
+    'rhac_groupme_client_total', 'GroupMe HTTP client requests and pooled connections', ('kind',))
+
+
+def _collect_groupme_client_stats():
+    stats = groupme_client.stats()
+    for kind in ('requests', 'connections_opened', 'connections_reused'):
+        groupme_connections.set(stats[kind], kind=kind)
+
+
+metrics_registry.add_collector(_collect_groupme_client_stats)
+
+
+def _storage_backend():
+    return chat_store.name
 
 
 def init_app():
@@ -27,7 +123,9 @@ def init_app():
     and MongoDB connection out of import-time execution so the module can be
     imported safely (for testing, linting, or use with WSGI servers).
     """
-    global buildings_data, chats_collection, _fallback_chats
+    global chat_store, broadcast_jobs, send_ledger, broadcast_plans, broadcast_history, storage_backend
+    global GROUPME_API_URL, GROUPME_IMAGE_URL
+    global send_rate_limiter, health_rate_limiter, send_retry_policy, image_cache, response_compressor
 
     # Validate and load configuration (warning-only in dev, raises in prod if enabled)
     try:
@@ -47,35 +145,313 @@ def init_app():
         # Fall back gracefully if method is missing for older installs
         app.config['MONGODB_DB_NAME'] = app.config.get('MONGODB_DB', 'rhac_db')
     CORS(app)
+    GROUPME_API_URL = app.config.get('GROUPME_API_URL', GROUPME_API_URL).rstrip('/')
+    GROUPME_IMAGE_URL = app.config.get('GROUPME_IMAGE_URL', GROUPME_IMAGE_URL).rstrip('/')
+    send_dispatcher.configure(app.config.get('SEND_MAX_IN_FLIGHT', 16))
+    join_dispatcher.configure(app.config.get('BULK_JOIN_MAX_IN_FLIGHT', 8))
+    health_dispatcher.configure(app.config.get('CHAT_HEALTH_MAX_IN_FLIGHT', 4))
+    groupme_client.configure(
+        pool_connections=app.config.get('GROUPME_POOL_CONNECTIONS'),
+        pool_maxsize=app.config.get('GROUPME_POOL_MAXSIZE'),
+        pool_block=app.config.get('GROUPME_POOL_BLOCK'),
+        timeout=app.config.get('GROUPME_TIMEOUT'),
+    )
+    send_rate_limiter = RateLimiter(
+        rate=app.config.get('GROUPME_RATE_LIMIT', 0),
+        burst=app.config.get('GROUPME_RATE_BURST'),
+        group_rate=app.config.get('GROUPME_GROUP_RATE_LIMIT', 0),
+        group_burst=app.config.get('GROUPME_GROUP_RATE_BURST'),
+    )
+    health_rate_limiter = RateLimiter(rate=app.config.get('CHAT_HEALTH_RATE_LIMIT', 0))
+    send_retry_policy = RetryPolicy(
+        max_retries=app.config.get('GROUPME_MAX_RETRIES', 3),
+        base_delay=app.config.get('GROUPME_BACKOFF_BASE', 0.5),
+        max_delay=app.config.get('GROUPME_BACKOFF_MAX', 30.0),
+    )
 
-    # Load buildings data safely
-    try:
-        with open("buildings.json", 'r', encoding='utf-8') as f:
-            buildings_data = json.load(f)
-    except FileNotFoundError:
-        logger.warning("buildings.json not found; using empty buildings list")
-        buildings_data = []
-    except json.JSONDecodeError as e:
-        logger.error("Failed to parse buildings.json: %s", e)
-        buildings_data = []
-
-    # MongoDB setup with safe fallbacks
-    chats_collection = None
-    _fallback_chats = []
-    if app.config.get('MONGODB_URI'):
+    image_cache = ImageCache(
+        app.config.get('IMAGE_CACHE_MAX_ENTRIES', 256), ttl=app.config.get('IMAGE_CACHE_TTL', 86400.0)
+    )
+    response_compressor = ResponseCompressor(
+        app.config.get('COMPRESS_MIN_SIZE', 1024),
+        gzip_level=app.config.get('COMPRESS_LEVEL', 6),
+        brotli_quality=app.config.get('COMPRESS_BROTLI_QUALITY', 4),
+    )
+    request_profiler.configure(
+        capacity=app.config.get('PROFILE_BUFFER_SIZE', 50),
+        enabled=app.config.get('PROFILE_REQUESTS', False),
+        mode=app.config.get('PROFILE_MODE', 'spans'),
+    )
+
+    # Load buildings data safely (missing or malformed files leave the list empty)
+    building_registry.path = app.config.get('BUILDINGS_FILE', 'buildings.json')
+    building_registry.reload_interval = app.config.get('BUILDINGS_RELOAD_INTERVAL', 5.0)
+    building_registry.load()
+
+    # Storage setup with safe fallbacks. STORAGE_BACKEND defaults to mongo when
+    # MONGODB_URI is set, otherwise to the in-memory store.
+    ledger_ttl = app.config.get('SEND_LEDGER_TTL', 7 * 86400)
+    chat_store = MemoryChatStore()
+    broadcast_history = MemoryBroadcastHistory()
+    broadcast_jobs = BroadcastJobStore()
+    send_ledger = SendLedger(ttl=ledger_ttl)
+    broadcast_plans = BroadcastPlanStore(ttl=app.config.get('BROADCAST_PLAN_TTL', 900.0))
+    backend = (app.config.get('STORAGE_BACKEND') or ('mongo' if app.config.get('MONGODB_URI') else 'memory')).lower()
+    storage_backend = backend
+    if backend == 'mongo' and not app.config.get('MONGODB_URI'):
+        logger.warning("STORAGE_BACKEND=mongo but MONGODB_URI not set; using in-memory fallback storage for chats")
+        storage_backend = 'memory'
+    elif backend == 'mongo':
+        # Serve from the in-memory store until the background connect succeeds
+        dbname = app.config.get('MONGODB_DB_NAME') or app.config.get('MONGODB_DB') or 'rhac_db'
+        mongo_connector.configure(
+            app.config['MONGODB_URI'],
+            dbname,
+            client_options=Config.MONGODB_CLIENT_OPTIONS(),
+            backoff_base=app.config.get('MONGODB_RECONNECT_BACKOFF_BASE', 1.0),
+            backoff_max=app.config.get('MONGODB_RECONNECT_BACKOFF_MAX', 60.0),
+            health_interval=app.config.get('MONGODB_HEALTH_INTERVAL', 15.0),
+        )
+        logger.info("Connecting to MongoDB %s in the background; using in-memory storage until connected", dbname)
+    elif backend == 'sqlite':
         try:
-            client = MongoClient(app.config['MONGODB_URI'], serverSelectionTimeoutMS=5000)
-            client.admin.command('ping')
-            dbname = app.config.get('MONGODB_DB_NAME') or app.config.get('MONGODB_DB') or 'rhac_db'
-            db = client[dbname]
-            chats_collection = db['chats']
-            logger.info("Connected to MongoDB: %s (env=%s)", dbname, app.config.get('APP_ENV'))
-        except pymongo_errors.PyMongoError:
-            logger.exception("Failed to connect to MongoDB; falling back to in-memory storage")
-            chats_collection = None
-            _fallback_chats = []
+            chat_store = create_chat_store('sqlite', sqlite_path=app.config.get('SQLITE_PATH', 'rhac.sqlite3'))
+            broadcast_history = create_history_store('sqlite', sqlite_path=chat_store.path)
+            logger.info("Using SQLite storage for chats: %s", chat_store.path)
+        except Exception:
+            logger.exception("Failed to open SQLite database; falling back to in-memory storage")
+    else:
+        if backend != 'memory':
+            logger.warning("Unknown STORAGE_BACKEND %r", backend)
+        logger.warning("Using in-memory fallback storage for chats")
+
+    # Background delivery for broadcasts submitted in job mode (re-pointed at MongoDB once connected)
+    broadcast_job_runner.configure(
+        store=broadcast_jobs,
+        workers=app.config.get('BROADCAST_JOB_WORKERS', 2),
+        lease=app.config.get('BROADCAST_JOB_LEASE', 300),
+    )
+    broadcast_job_runner.resume_pending(app.config.get('APP_ENV'))
+    broadcast_scheduler.configure(
+        store=broadcast_jobs, refresh_interval=app.config.get('BROADCAST_SCHEDULE_REFRESH', 60.0)
+    )
+    broadcast_scheduler.start(app.config.get('APP_ENV'))
+    chat_health.configure(
+        interval=app.config.get('CHAT_HEALTH_SWEEP_INTERVAL', 21600.0),
+        dead_after=app.config.get('CHAT_DEAD_AFTER_FAILURES', 3),
+    )
+    chat_health.start(app.config.get('APP_ENV'))
+    if storage_backend == 'mongo':
+        mongo_connector.start()
+
+
+def _attach_mongo(db):
+    """Switch storage to MongoDB; called by ``mongo_connector`` once the server answers.
+
+    Everything the in-memory fallback accepted while MongoDB was unreachable
+    is carried over: chats, scheduled and queued broadcast jobs, send ledger
+    records, recipient plans and broadcast history. Each is copied once before
+    the stores are swapped and again afterwards, to catch writes that landed
+    in between. Jobs that already started stay in memory, where their status
+    URL still finds them. Queued jobs in MongoDB are then resumed and
+    scheduled ones are loaded into the scheduler.
+    """
+    global chat_store, broadcast_jobs, send_ledger, broadcast_plans, broadcast_history
+    env = app.config.get('APP_ENV')
+    mongo_store = create_chat_store(
+        'mongo',
+        db=db,
+        cache_ttl=app.config.get('RECIPIENT_CACHE_TTL', 300.0),
+        version_check_interval=app.config.get('RECIPIENT_CACHE_VERSION_CHECK', 5.0),
+    )
+    mongo_store.ensure_indexes()
+    mongo_store.check_query_plans(env)
+    ledger = SendLedger(db['send_ledger'], ttl=app.config.get('SEND_LEDGER_TTL', 7 * 86400))
+    ledger.ensure_indexes()
+    plans = BroadcastPlanStore(db['broadcast_plans'], ttl=app.config.get('BROADCAST_PLAN_TTL', 900.0))
+    plans.ensure_indexes()
+    history = create_history_store('mongo', db=db)
+    history.ensure_indexes()
+    # The in-memory stores in use until now (still the same objects if an earlier attempt failed midway)
+    memory_jobs = broadcast_jobs if broadcast_jobs.collection is None else broadcast_jobs.fallback
+    memory_ledger = send_ledger if send_ledger.collection is None else SendLedger()
+    memory_plans = broadcast_plans if broadcast_plans.collection is None else BroadcastPlanStore()
+    memory_history = broadcast_history
+    if not isinstance(memory_history, MemoryBroadcastHistory):
+        memory_history = MemoryBroadcastHistory()
+    jobs = BroadcastJobStore(db['broadcast_jobs'], fallback=memory_jobs)
+    jobs.ensure_indexes()
+
+    def carry_over():
+        for label, count in (
+            ('broadcast jobs', jobs.adopt_pending(memory_jobs)),
+            ('send ledger records', ledger.adopt(memory_ledger)),
+            ('broadcast plans', plans.adopt(memory_plans)),
+            ('broadcasts from the history', history.adopt(memory_history)),
+        ):
+            if count:
+                logger.info("Copied %d %s created before MongoDB was reachable", count, label)
+
+    carry_over()
+    fallback = chat_store
+    pending = fallback.all_chats() if isinstance(fallback, MemoryChatStore) else []
+    if pending:
+        stored = mongo_store.add_chats(pending)
+        logger.info("Copied %d chats added before MongoDB was reachable (%d already stored)",
+                    len(pending), sum(1 for chat in stored if chat is None))
+
+    chat_store = mongo_store
+    # Catch chats added to the fallback while the copy above was running
+    late = fallback.all_chats()[len(pending):] if isinstance(fallback, MemoryChatStore) else []
+    if late:
+        mongo_store.add_chats(late)
+    broadcast_jobs = jobs
+    send_ledger = ledger
+    broadcast_plans = plans
+    broadcast_history = history
+    broadcast_job_runner.configure(store=broadcast_jobs)
+    broadcast_scheduler.configure(store=broadcast_jobs)
+    carry_over()
+    broadcast_job_runner.resume_pending(env)
+    broadcast_scheduler.refresh()
+
+
+# Background MongoDB connection with reconnect/backoff; configured and started in init_app
+mongo_connector = MongoConnector(on_connect=_attach_mongo)
+# Storage backend chosen in init_app (the active chat_store may still be the fallback)
+storage_backend = 'memory'
+
+
+def _collect_mongo_state():
+    mongo_connected.set(1 if mongo_connector.connected else 0)
+
+
+mongo_connected = metrics_registry.gauge('rhac_mongo_connected', 'Whether this worker is connected to MongoDB')
+metrics_registry.add_collector(_collect_mongo_state)
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+
+@app.before_request
+def _start_request_profile():
+    if request.path.startswith('/api/debug/profiles'):
+        return
+    # X-Profile: 1 (default mode), spans or cprofile; only honoured for admin requests
+    requested = request.headers.get('X-Profile', '').strip().lower()
+    if requested and requested not in ('0', 'false', 'off') and _is_admin_password(request.headers.get('X-Admin-Password')):
+        mode = requested
+    elif request_profiler.enabled:
+        mode = None
     else:
-        logger.warning("MONGODB_URI not set; using in-memory fallback storage for chats")
+        return
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    g.request_profile = request_profiler.start(request.method, request.path, route, mode)
+
+
+@app.after_request
+def _finish_request_profile(response):
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        response.headers['X-Profile-Id'] = profile.id
+        status = response.status_code
+        # Finished on close, so streamed broadcast results are profiled to the last line
+        response.call_on_close(lambda: request_profiler.finish(profile, status))
+    return response
+
+
+@app.after_request
+def _compress_response(response):
+    if response_compressor.min_size >= 0:
+        response_compressor.process(response, request.accept_encodings)
+    return response
+
+
+def _conditional_json(body):
+    """Return ``body`` as a 200 JSON response with an ETag, or a bodiless 304 if the client has it."""
+    response = jsonify(body)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@app.after_request
+def _record_request_latency(response):
+    started = g.pop('request_started_at', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        # Streamed responses are timed until their headers are sent
+        http_request_seconds.observe(
+            time.perf_counter() - started, route=route, method=request.method, status=response.status_code
+        )
+    return response
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip() or request.args.get('token')
+        if supplied != token:
+            return jsonify({'error': 'Unauthorized'}), 401
+    return app.response_class(metrics_registry.expose(), content_type=Registry.CONTENT_TYPE), 200
+
+
+@app.route('/api/debug/profiles', methods=['GET', 'DELETE'])
+def list_request_profiles():
+    password = request.headers.get('X-Admin-Password') or request.args.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+    if request.method == 'DELETE':
+        return jsonify({'cleared': request_profiler.clear()}), 200
+    return jsonify({
+        'enabled': request_profiler.enabled,
+        'mode': request_profiler.mode,
+        'profiles': request_profiler.recent(),
+    }), 200
+
+
+@app.route('/api/debug/profiles/<profile_id>', methods=['GET'])
+def get_request_profile(profile_id):
+    password = request.headers.get('X-Admin-Password') or request.args.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify(profile), 200
+
+
+@app.route('/api/health', methods=['GET'])
+def get_health():
+    """Liveness plus storage state. 503 while a configured MongoDB is not connected."""
+    mongo = mongo_connector.status()
+    healthy = storage_backend != 'mongo' or mongo['state'] == STATE_CONNECTED
+    body = {
+        'status': 'ok' if healthy else 'degraded',
+        'storage': {'configured': storage_backend, 'active': chat_store.name},
+    }
+    if mongo['state'] != STATE_DISABLED:
+        body['mongo'] = mongo
+    return jsonify(body), 200 if healthy else 503
+
+
+def _is_admin_password(password):
+    return bool(password) and password == app.config.get('ADMIN_PASSWORD')
+
+
+def _roster_unavailable():
+    """A 503 response while MongoDB is configured but not connected yet, else None.
+
+    Until then chats live in the in-memory fallback, which holds only chats
+    added since startup, so a broadcast or plan would see an incomplete roster.
+    """
+    if storage_backend != 'mongo' or chat_store.name == 'mongo':
+        return None
+    response = jsonify({'error': 'Chat storage is still connecting; try again shortly', 'mongo': mongo_connector.status()})
+    response.headers['Retry-After'] = '5'
+    return response, 503
 
 
 # Endpoint to add a floor chat
@@ -98,12 +474,8 @@ def add_floor_chat():
 
     print(f'Group ID: {group_id}, Share Token: {share_token}')
 
-    # Check if the chat already exists in the database or fallback storage
-    if chats_collection is not None:
-        # Only consider chats for the active environment
-        existing_chat = chats_collection.find_one({'groupme_id': group_id, 'env': app.config.get('APP_ENV')})
-    else:
-        existing_chat = next((c for c in _fallback_chats if c['groupme_id'] == group_id and c.get('env') == app.config.get('APP_ENV')), None)
+    # Check if the chat already exists in storage (only for the active environment)
+    existing_chat = find_chat(group_id)
 
     if existing_chat:
         logger.info("GroupMe ID already exists in storage: %s", group_id)
@@ -121,6 +493,333 @@ def add_floor_chat():
 
     return jsonify({'message': 'Chat added successfully', 'chat': chat}), 200
 
+@app.route('/api/chats/health', methods=['GET'])
+def get_chat_health():
+    password = request.headers.get('X-Admin-Password') or request.args.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        chats = chat_store.list_chats(app.config.get('APP_ENV'))
+    except Exception:
+        logger.exception("Failed to list chats from %s storage", chat_store.name)
+        return jsonify({'error': 'Failed to load chats'}), 500
+    inactive = [
+        {key: chat.get(key) for key in ('groupme_id', 'building_id', 'floor_number', 'inactive_reason')}
+        for chat in chats if chat.get('active') is False
+    ]
+    return _conditional_json({
+        'active': len(chats) - len(inactive),
+        'inactive': len(inactive),
+        'inactive_chats': inactive,
+        'last_sweep': chat_health.last_sweep,
+    })
+
+
+@app.route('/api/chats/health/sweep', methods=['POST'])
+def start_chat_health_sweep():
+    password = request.headers.get('X-Admin-Password') or request.form.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    # A sweep makes one GroupMe call per chat, so run it off the request thread
+    threading.Thread(
+        target=chat_health.sweep, args=(app.config.get('APP_ENV'),), name='chat-health-sweep', daemon=True
+    ).start()
+    return jsonify({'message': 'Chat health sweep started', 'status_url': '/api/chats/health'}), 202
+
+
+BULK_CHAT_FIELDS = ('groupme_link', 'building_id', 'floor_number')
+
+
+def _coerce_int(value):
+    """CSV cells arrive as strings; turn numeric ones into ints like the JSON API sends."""
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _parse_bulk_chat_rows():
+    """Return the list of row dicts submitted to /api/chats/bulk.
+
+    Accepts a JSON list, a JSON object with a ``chats`` list, a ``text/csv``
+    body, or a CSV upload in the ``file`` form field. CSV input may start with
+    a ``groupme_link,building_id,floor_number`` header row.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True)
+        rows = data.get('chats') if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            return None
+        return [row if isinstance(row, dict) else {} for row in rows]
+
+    upload = request.files.get('file')
+    if upload is not None:
+        text = upload.read().decode('utf-8-sig')
+    elif request.mimetype == 'text/csv':
+        text = request.get_data(as_text=True)
+    else:
+        return None
+
+    rows = []
+    for record in csv.reader(io.StringIO(text)):
+        if not record or not any(cell.strip() for cell in record):
+            continue
+        if not rows and record[0].strip().lower() == 'groupme_link':
+            continue
+        values = [cell.strip() for cell in record] + [''] * len(BULK_CHAT_FIELDS)
+        rows.append({
+            'groupme_link': values[0],
+            'building_id': _coerce_int(values[1]) if values[1] else None,
+            'floor_number': _coerce_int(values[2]) if values[2] else None,
+        })
+    return rows
+
+
+# Endpoint to add many floor chats at once (e.g. at the start of a semester)
+@app.route('/api/chats/bulk', methods=['POST'])
+def add_floor_chats_bulk():
+    password = request.headers.get('X-Admin-Password') or request.form.get('password')
+    json_body = request.get_json(silent=True) if request.is_json else None
+    if not password and isinstance(json_body, dict):
+        password = json_body.get('password')
+    if not _is_admin_password(password):
+        logger.warning("Unauthorized bulk chat import attempt")
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        rows = _parse_bulk_chat_rows()
+    except UnicodeDecodeError:
+        return jsonify({'error': 'CSV must be UTF-8'}), 400
+    if rows is None:
+        return jsonify({'error': 'Expected a JSON list of chats or a CSV of groupme_link,building_id,floor_number'}), 400
+    if not rows:
+        return jsonify({'error': 'No chats provided'}), 400
+    max_rows = app.config.get('BULK_IMPORT_MAX_ROWS', 1000)
+    if len(rows) > max_rows:
+        return jsonify({'error': f'Too many chats; the limit is {max_rows} per request'}), 400
+
+    env = app.config.get('APP_ENV')
+    results = []
+    candidates = {}  # group_id -> (result, share_token), first occurrence wins
+    for index, row in enumerate(rows):
+        groupme_link = row.get('groupme_link')
+        building_id = row.get('building_id')
+        floor_number = row.get('floor_number')
+        result = {
+            'row': index,
+            'groupme_link': groupme_link,
+            'group_id': None,
+            'building_id': building_id,
+            'floor_number': floor_number,
+            'status': None,
+            'error': None,
+        }
+        results.append(result)
+
+        if not (groupme_link and building_id is not None and building_id != '' and floor_number is not None):
+            result.update(status='invalid', error='Missing groupme_link, building_id, or floor_number')
+            continue
+        group_info = extract_group_id_and_token_from_link(groupme_link) if isinstance(groupme_link, str) else None
+        if not group_info:
+            result.update(status='invalid', error='Invalid GroupMe link')
+            continue
+        group_id, share_token = group_info
+        result['group_id'] = group_id
+        if group_id in candidates:
+            result.update(status='duplicate', error='Chat appears more than once in this request')
+            continue
+        candidates[group_id] = (result, share_token)
+
+    # One round trip to find chats that are already stored
+    try:
+        existing = chat_store.existing_groupme_ids(env, candidates)
+    except Exception:
+        logger.exception("Failed to check existing chats in %s storage", chat_store.name)
+        return jsonify({'error': 'Failed to check existing chats'}), 500
+    for group_id in existing:
+        result, _ = candidates.pop(group_id)
+        result.update(status='duplicate', error='Chat already exists')
+
+    # Join the remaining groups concurrently
+    def _join(group_id):
+        try:
+            return join_group(group_id, candidates[group_id][1])
+        except Exception:
+            logger.exception("Unexpected error while joining group %s", group_id)
+            return False
+
+    joined = []
+    for group_id, ok in join_dispatcher.imap_unordered(_join, list(candidates)):
+        result = candidates[group_id][0]
+        if ok:
+            joined.append(result)
+        else:
+            result.update(status='join_failed', error='Failed to join the GroupMe group')
+
+    # Store every joined chat with one batched write
+    joined.sort(key=lambda r: r['row'])
+    chats = [
+        {'groupme_id': r['group_id'], 'building_id': r['building_id'], 'floor_number': r['floor_number'], 'env': env}
+        for r in joined
+    ]
+    try:
+        stored = chat_store.add_chats(chats)
+    except Exception:
+        logger.exception("Failed to bulk insert chats into %s storage", chat_store.name)
+        stored = [INSERT_FAILED] * len(chats)
+    for result, chat in zip(joined, stored):
+        if chat is INSERT_FAILED:
+            result.update(status='insert_failed', error='Failed to add chat')
+        elif chat is None:
+            result.update(status='duplicate', error='Chat already exists')
+        else:
+            result['status'] = 'added'
+
+    summary = {'total': len(results)}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    logger.info("Bulk chat import finished: %s", summary)
+
+    added = summary.get('added', 0)
+    if added == len(results):
+        return jsonify({'message': 'All chats added successfully', 'summary': summary, 'results': results}), 200
+    elif added > 0:
+        return jsonify({'message': 'Some chats were added', 'summary': summary, 'results': results}), 207
+    else:
+        return jsonify({'message': 'No chats were added', 'summary': summary, 'results': results}), 400
+
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+def _broadcast_fingerprint(building_ids, message_body):
+    """Hash of what a broadcast sends, so an idempotency key cannot be reused for a different one."""
+    payload = json.dumps({'building_ids': sorted(building_ids), 'message_body': message_body}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+# How far in the past send_at may be (clock skew, slow form submits) before it is rejected
+SEND_AT_GRACE_SECONDS = 60
+
+
+def _parse_send_at(value):
+    """Parse ``send_at`` (epoch seconds or ISO 8601; naive times are UTC) into epoch seconds.
+
+    Raises ValueError for anything else, including ``nan`` and ``inf``.
+    """
+    value = str(value).strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        when = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return when.timestamp()
+    if not math.isfinite(seconds):
+        raise ValueError(f"not a finite time: {value!r}")
+    return seconds
+
+
+def _job_accepted_response(job):
+    scheduled = job['status'] == JOB_SCHEDULED
+    return jsonify({
+        'message': 'Broadcast scheduled' if scheduled else 'Broadcast queued',
+        'job_id': job['_id'],
+        'status': job['status'],
+        'run_at': job.get('run_at'),
+        'progress': job['progress'],
+        'status_url': f"/api/messages/jobs/{job['_id']}",
+    }), 202
+
+
+def _resolve_building_ids(building_ids, regions):
+    """Turn the submitted ``building_ids`` (preferred) or ``regions`` into building ids.
+
+    Returns ``(building_ids, None)``, or ``(None, error_response)`` for bad input.
+    """
+    if building_ids:
+        # Ensure building_ids is a list of integers
+        try:
+            return [int(bid) for bid in building_ids], None
+        except (TypeError, ValueError):
+            return None, (jsonify({'error': 'building_ids must be integers'}), 400)
+    # Handle regions selection ('all' selects every building)
+    building_registry.maybe_reload()
+    resolved = building_registry.ids_for_regions(regions)
+    if not resolved and 'all' not in regions:
+        return None, (jsonify({'error': f'No buildings found in regions {regions}'}), 400)
+    return resolved, None
+
+
+# Endpoint to preview which chats a broadcast would reach, without sending anything
+@app.route('/api/messages/plan', methods=['POST'])
+def plan_broadcast():
+    data = request.get_json(silent=True) if request.is_json else None
+    if isinstance(data, dict):
+        building_ids = data.get('building_ids') or []
+        regions = data.get('regions') or []
+        password = data.get('password')
+    else:
+        building_ids = request.form.getlist('building_ids')
+        regions = request.form.getlist('regions')
+        password = request.form.get('password') or request.form.get('auth')
+    password = request.headers.get('X-Admin-Password') or password
+    if not _is_admin_password(password):
+        logger.warning("Unauthorized plan_broadcast attempt")
+        return jsonify({'error': 'Unauthorized'}), 401
+    unavailable = _roster_unavailable()
+    if unavailable:
+        return unavailable
+
+    if not (building_ids or regions):
+        return jsonify({'error': 'Missing building_ids or regions'}), 400
+    building_ids, error = _resolve_building_ids(building_ids, regions)
+    if error:
+        return error
+
+    group_map = get_groupme_map_by_buildings(building_ids)
+    per_building = []
+    per_region = {}
+    for bid, entries in group_map.items():
+        building = building_registry.get(bid) or {}
+        region = building.get('region')
+        per_building.append({
+            'building_id': bid,
+            'building_name': building.get('name', ''),
+            'region': region,
+            'group_count': len(entries),
+            'groups': [dict(zip(('group_id', 'floor_number'), _split_group_entry(g))) for g in entries],
+        })
+        per_region[region or 'unknown'] = per_region.get(region or 'unknown', 0) + len(entries)
+    total_groups = sum(b['group_count'] for b in per_building)
+
+    # Nothing to send to, so there is nothing worth storing a plan for
+    plan, warning = None, None
+    if total_groups:
+        try:
+            plan = broadcast_plans.create(app.config.get('APP_ENV'), building_ids, group_map)
+        except Exception:
+            # The preview is still accurate; the send just falls back to resolving recipients itself
+            logger.exception("Failed to store broadcast plan")
+            warning = 'Could not save this plan; sending will look up recipients again'
+    body = {
+        'plan_token': plan['_id'] if plan else None,
+        'expires_at': plan['expires_at'] if plan else None,
+        'total_groups': total_groups,
+        'per_region': per_region,
+        'per_building': per_building,
+    }
+    if warning:
+        body['warning'] = warning
+    return jsonify(body), 200
+
+
 # Endpoint to send messages to chats based on building IDs or regions
 @app.route('/api/messages/send', methods=['POST'])
 def send_messages():
@@ -132,64 +831,418 @@ def send_messages():
 
     # Validate executive/admin password server-side
     password = request.form.get('password') or request.form.get('auth')
-    if not password or password != app.config.get('ADMIN_PASSWORD'):
+    if not _is_admin_password(password):
         logger.warning("Unauthorized send_messages attempt")
         return jsonify({'error': 'Unauthorized'}), 401
+    unavailable = _roster_unavailable()
+    if unavailable:
+        return unavailable
 
-    if not (building_ids or regions) or not message_body:
-        return jsonify({'error': 'Missing building_ids or regions, or message_body'}), 400
+    plan_token = request.form.get('plan_token')
+    if not (building_ids or regions or plan_token) or not message_body:
+        return jsonify({'error': 'Missing building_ids, regions or plan_token, or message_body'}), 400
 
-    # Determine building_ids based on regions or provided list
-    if building_ids:
-        # Ensure building_ids is a list of integers
-        building_ids = [int(bid) for bid in building_ids]
+    env = app.config.get('APP_ENV')
+    plan = None
+    if plan_token:
+        # Reuse the recipients resolved by /api/messages/plan instead of looking them up again
+        try:
+            plan = broadcast_plans.get(plan_token, env)
+        except Exception:
+            logger.exception("Failed to load broadcast plan %s", plan_token)
+            return jsonify({'error': 'Failed to load broadcast plan'}), 500
+        if plan is None:
+            return jsonify({'error': 'Broadcast plan not found or expired'}), 400
+        building_ids = plan['building_ids']
+        group_map = group_map_from_rows(plan['recipients'])
     else:
-        # Handle regions selection
-        if 'all' in regions:
-            # Use all building IDs
-            building_ids = [building['id'] for building in buildings_data]
-        else:
-            # Get building IDs for the specified regions
-            building_ids = [building['id'] for building in buildings_data if building['region'] in regions]
-            if not building_ids:
-                return jsonify({'error': f'No buildings found in regions {regions}'}), 400
-
-    # Map building_id -> groupme_ids
-    group_map = get_groupme_map_by_buildings(building_ids)
+        # Determine building_ids based on regions or provided list
+        building_ids, error = _resolve_building_ids(building_ids, regions)
+        if error:
+            return error
+        # Map building_id -> groupme_ids
+        group_map = get_groupme_map_by_buildings(building_ids)
 
     # If no group chats found for any building, return 404
     total_groups = sum(len(v) for v in group_map.values())
     if total_groups == 0:
         return jsonify({'error': 'No group chats found for the provided building IDs'}), 404
 
-    # If an image file is provided, upload it to GroupMe Image Service
-    image_url = None
-    if image_file:
+    # Scheduled broadcasts are stored as jobs and started by broadcast_scheduler at send_at
+    send_at = request.form.get('send_at') or request.args.get('send_at')
+    run_at = None
+    if send_at:
+        try:
+            run_at = _parse_send_at(send_at)
+        except ValueError:
+            return jsonify({'error': 'send_at must be an ISO 8601 time or epoch seconds'}), 400
+        if run_at < time.time() - SEND_AT_GRACE_SECONDS:
+            return jsonify({'error': 'send_at is in the past'}), 400
+
+    # Idempotent retries: a repeated key only sends to groups not yet confirmed
+    idempotency_key = (request.headers.get('Idempotency-Key') or request.form.get('idempotency_key') or '').strip()
+    idempotency_key = idempotency_key or None
+    ledger_record = None
+    if idempotency_key:
+        if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency key longer than {MAX_IDEMPOTENCY_KEY_LENGTH} characters'}), 400
+        try:
+            ledger_record = send_ledger.begin(env, idempotency_key, _broadcast_fingerprint(building_ids, message_body))
+        except Exception:
+            # Sends still use key-derived source_guids, so GroupMe drops repeats
+            logger.exception("Failed to load send ledger for idempotency key %s", idempotency_key)
+        if ledger_record and ledger_record.get('fingerprint') != _broadcast_fingerprint(building_ids, message_body):
+            return jsonify({'error': 'Idempotency key was already used for a different broadcast'}), 422
+
+    # If an image file is provided, upload it to GroupMe Image Service (once per idempotent broadcast)
+    image_url = ledger_record.get('image_url') if ledger_record else None
+    if image_file and not image_url:
         image_url = upload_image_to_groupme(image_file)
         if not image_url:
             return jsonify({'error': 'Failed to upload image to GroupMe'}), 500
+        if ledger_record:
+            try:
+                send_ledger.update(env, idempotency_key, image_url=image_url)
+            except Exception:
+                # A retry uploads the image again; the sends themselves are unaffected
+                logger.exception("Failed to record image for idempotency key %s", idempotency_key)
 
-    # Send messages grouped by building and collect results per building
-    per_building_results = []
-    overall_successes = 0
-    overall_failures = 0
+    # Job mode: persist the broadcast and deliver it in the background, now or at send_at
+    if run_at is not None or _is_truthy(request.form.get('async') or request.args.get('async')):
+        if ledger_record and ledger_record.get('job_id'):
+            job = broadcast_jobs.get(ledger_record['job_id'], env)
+            if job is not None and job['status'] in (JOB_SCHEDULED, JOB_QUEUED, JOB_RUNNING):
+                return _job_accepted_response(job)
+        try:
+            job = broadcast_jobs.create(
+                env,
+                {
+                    'building_ids': building_ids,
+                    'message_body': message_body,
+                    'image_url': image_url,
+                    'idempotency_key': idempotency_key,
+                    # A planned broadcast keeps the recipients that were previewed
+                    'recipients': plan['recipients'] if plan else None,
+                },
+                total_groups,
+                run_at=run_at,
+            )
+        except Exception:
+            logger.exception("Failed to store broadcast job")
+            return jsonify({'error': 'Failed to queue broadcast'}), 500
+        if ledger_record:
+            try:
+                send_ledger.update(env, idempotency_key, job_id=job['_id'])
+            except Exception:
+                # A retry queues a second job, but the ledger still skips groups this one reached
+                logger.exception("Failed to record job %s for idempotency key %s", job['_id'], idempotency_key)
+        if run_at is not None:
+            broadcast_scheduler.add(job['_id'], run_at)
+        else:
+            broadcast_job_runner.submit(job['_id'])
+        return _job_accepted_response(job)
+
+    # Streaming mode: one NDJSON line per group as each delivery finishes
+    if request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+        response = app.response_class(
+            stream_with_context(stream_send_results(group_map, message_body, image_url, idempotency_key)),
+            mimetype=NDJSON_MIMETYPE,
+        )
+        # Ask reverse proxies (nginx) not to buffer the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
 
-    # Build a quick lookup for building names
-    building_lookup = {b['id']: b.get('name', '') for b in buildings_data}
+    per_building_results, overall_successes, overall_failures = deliver_to_group_map(
+        group_map, message_body, image_url, idempotency_key=idempotency_key
+    )
+    return build_send_response(per_building_results, overall_successes, overall_failures)
 
+
+@app.route('/api/messages/jobs/<job_id>', methods=['GET'])
+def get_broadcast_job(job_id):
+    password = request.headers.get('X-Admin-Password') or request.args.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        job = broadcast_jobs.get(job_id, app.config.get('APP_ENV'))
+    except Exception:
+        logger.exception("Failed to load broadcast job %s", job_id)
+        return jsonify({'error': 'Failed to load job'}), 500
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    return _conditional_json({
+        'job_id': job['_id'],
+        'status': job['status'],
+        'created_at': job.get('created_at'),
+        'started_at': job.get('started_at'),
+        'finished_at': job.get('finished_at'),
+        'run_at': job.get('run_at'),
+        'progress': job.get('progress'),
+        'status_code': job.get('status_code'),
+        'result': job.get('result'),
+    })
+
+
+def _scheduled_job_summary(job):
+    job_request = job.get('request') or {}
+    return {
+        'job_id': job['_id'],
+        'status': job['status'],
+        'run_at': job.get('run_at'),
+        'created_at': job.get('created_at'),
+        'building_ids': job_request.get('building_ids'),
+        'message_body': job_request.get('message_body'),
+        'image_url': job_request.get('image_url'),
+        'total_groups': (job.get('progress') or {}).get('total'),
+    }
+
+
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+# Window /api/messages/stats covers when no since is given
+STATS_DEFAULT_WINDOW = 30 * 86400
+
+
+def _history_summary(broadcast):
+    summary = {key: value for key, value in broadcast.items() if key not in ('_id', 'deliveries')}
+    return {'broadcast_id': broadcast['_id'], **summary}
+
+
+@app.route('/api/messages/history', methods=['GET'])
+def list_broadcast_history():
+    """Finished broadcasts, newest first, one page at a time.
+
+    ``cursor`` is the ``next_cursor`` of the previous page. Pages are keyed on
+    ``(created_at, broadcast_id)`` rather than an offset, so later pages cost
+    the same index range scan as the first.
+    """
+    password = request.headers.get('X-Admin-Password') or request.args.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), MAX_HISTORY_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    before = None
+    cursor = request.args.get('cursor')
+    if cursor:
+        created_at, _, broadcast_id = cursor.partition(':')
+        try:
+            before = (float(created_at), broadcast_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    try:
+        # One extra row tells whether there is a next page
+        broadcasts = broadcast_history.list_broadcasts(app.config.get('APP_ENV'), limit + 1, before)
+    except Exception:
+        logger.exception("Failed to load broadcast history")
+        return jsonify({'error': 'Failed to load broadcast history'}), 500
+    next_cursor = None
+    if len(broadcasts) > limit:
+        broadcasts = broadcasts[:limit]
+        last = broadcasts[-1]
+        next_cursor = f"{last['created_at']!r}:{last['_id']}"
+    return _conditional_json({
+        'broadcasts': [_history_summary(broadcast) for broadcast in broadcasts],
+        'next_cursor': next_cursor,
+    })
+
+
+@app.route('/api/messages/history/<broadcast_id>', methods=['GET'])
+def get_broadcast_history(broadcast_id):
+    password = request.headers.get('X-Admin-Password') or request.args.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        broadcast = broadcast_history.get_broadcast(app.config.get('APP_ENV'), broadcast_id)
+    except Exception:
+        logger.exception("Failed to load broadcast %s from the history", broadcast_id)
+        return jsonify({'error': 'Failed to load broadcast history'}), 500
+    if broadcast is None:
+        return jsonify({'error': 'Broadcast not found'}), 404
+    return _conditional_json({**_history_summary(broadcast), 'deliveries': broadcast['deliveries']})
+
+
+@app.route('/api/messages/stats', methods=['GET'])
+def get_broadcast_stats():
+    """Delivery counts and failure rates over ``[since, until)``, grouped by building, day or status code."""
+    password = request.headers.get('X-Admin-Password') or request.args.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    group_by = request.args.get('group_by', 'building')
+    if group_by not in GROUP_BY_FIELDS:
+        return jsonify({'error': f"group_by must be one of {', '.join(GROUP_BY_FIELDS)}"}), 400
+    try:
+        until = _parse_send_at(request.args['until']) if request.args.get('until') else time.time()
+        since = _parse_send_at(request.args['since']) if request.args.get('since') else until - STATS_DEFAULT_WINDOW
+    except ValueError:
+        return jsonify({'error': 'since and until must be ISO 8601 times or epoch seconds'}), 400
+    building_ids = request.args.getlist('building_ids')
+    try:
+        building_ids = [int(bid) for bid in building_ids]
+    except ValueError:
+        return jsonify({'error': 'building_ids must be integers'}), 400
+
+    try:
+        rows = broadcast_history.stats(app.config.get('APP_ENV'), since, until, group_by, building_ids)
+    except Exception:
+        logger.exception("Failed to aggregate broadcast stats")
+        return jsonify({'error': 'Failed to load broadcast stats'}), 500
+    if group_by == 'building':
+        for row in rows:
+            row['building_name'] = building_registry.name(row['key'])
+    total = sum(row['total'] for row in rows)
+    sent = sum(row['sent'] for row in rows)
+    return _conditional_json({
+        'since': since,
+        'until': until,
+        'group_by': group_by,
+        'totals': {
+            'total': total,
+            'sent': sent,
+            'failed': total - sent,
+            'failure_rate': round((total - sent) / total, 4) if total else 0.0,
+        },
+        'rows': rows,
+    })
+
+
+@app.route('/api/messages/scheduled', methods=['GET'])
+def list_scheduled_broadcasts():
+    password = request.headers.get('X-Admin-Password') or request.args.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        jobs = broadcast_jobs.scheduled(app.config.get('APP_ENV'))
+    except Exception:
+        logger.exception("Failed to list scheduled broadcasts")
+        return jsonify({'error': 'Failed to load scheduled broadcasts'}), 500
+    return _conditional_json({'scheduled': [_scheduled_job_summary(job) for job in jobs]})
+
+
+@app.route('/api/messages/scheduled/<job_id>', methods=['DELETE'])
+def cancel_scheduled_broadcast(job_id):
+    password = request.headers.get('X-Admin-Password') or request.args.get('password')
+    if not _is_admin_password(password):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    env = app.config.get('APP_ENV')
+    try:
+        job = broadcast_jobs.cancel(job_id, env)
+        if job is None:
+            existing = broadcast_jobs.get(job_id, env)
+    except Exception:
+        logger.exception("Failed to cancel scheduled broadcast %s", job_id)
+        return jsonify({'error': 'Failed to cancel scheduled broadcast'}), 500
+    if job is None:
+        if existing is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify({'error': f"Broadcast is already {existing['status']}", 'status': existing['status']}), 409
+
+    logger.info("Cancelled scheduled broadcast %s", job_id)
+    return jsonify({'message': 'Scheduled broadcast cancelled', **_scheduled_job_summary(job)}), 200
+
+
+def _is_truthy(value):
+    return str(value or '').lower() in ('1', 'true', 'yes', 'on')
+
+
+def _split_group_entry(g):
+    """Return ``(group_id, floor_number)`` for a group map entry.
+
+    Each group entry may be a dict with group_id and floor_number (new structure),
+    or a plain group id string for backward compatibility.
+    """
+    if isinstance(g, dict):
+        return g.get('group_id'), g.get('floor_number')
+    return g, None
+
+
+def iter_group_sends(group_map, message_body, image_url=None, idempotency_key=None, source='request', job_id=None):
+    """Send ``message_body`` to every group in ``group_map`` concurrently.
+
+    Sends run on ``send_dispatcher`` so at most ``SEND_MAX_IN_FLIGHT`` requests
+    are outstanding at once. Yields ``(building_id, slot, entry)`` in completion
+    order, where ``slot`` is the entry's index within that building's groups.
+
+    ``message_body`` may contain placeholders (see ``templating.PLACEHOLDERS``).
+    It is compiled once and rendered for every group up front, from the
+    building's entry in the registry and the chat's floor.
+
+    With an ``idempotency_key``, groups the send ledger already has as delivered
+    are not sent again; their stored result is yielded first with
+    ``replayed: True``. Every new outcome is written to the ledger.
+
+    When the sends finish (or the caller stops iterating), the broadcast and its
+    new outcomes are written to ``broadcast_history`` in one batch, tagged with
+    ``source`` ('request', 'stream' or 'job') and ``job_id``.
+    """
+    started_at = time.time()
+    template = MessageTemplate(message_body)
+    env = app.config.get('APP_ENV')
+    delivered = {}
+    if idempotency_key:
+        try:
+            delivered = send_ledger.delivered(env, idempotency_key)
+        except Exception:
+            logger.exception("Failed to read send ledger for idempotency key %s", idempotency_key)
+
+    jobs = []
+    replayed = []
     for bid, group_entries in group_map.items():
-        # Each group entry may be a dict with group_id and floor_number (new structure),
-        # or a plain group id string for backward compatibility.
-        building_entry = {'building_id': bid, 'building_name': building_lookup.get(bid, ''), 'results': []}
-        for g in group_entries:
-            if isinstance(g, dict):
-                gid = g.get('group_id')
-                floor_number = g.get('floor_number')
+        if not template.static:
+            building = building_registry.get(bid) or {}
+            context = {
+                'building_id': bid,
+                'building_name': building.get('name', ''),
+                'region': building.get('region', ''),
+                'address': building.get('address', ''),
+            }
+        for slot, g in enumerate(group_entries):
+            gid, floor_number = _split_group_entry(g)
+            previous = delivered.get(str(gid))
+            if previous is not None:
+                replayed.append((bid, slot, {
+                    'group_id': gid,
+                    'floor_number': floor_number,
+                    'success': True,
+                    'status_code': previous.get('status_code'),
+                    'error': None,
+                    'replayed': True,
+                }))
             else:
-                gid = g
-                floor_number = None
+                text = template.source if template.static else template.render({**context, 'floor_number': floor_number})
+                jobs.append((bid, slot, gid, floor_number, text))
+
+    def _send(job):
+        gid, text = job[2], job[4]
+        source_guid = SendLedger.source_guid(idempotency_key, gid) if idempotency_key else None
+        try:
+            res = send_message_to_group(gid, text, image_url, source_guid=source_guid)
+        except Exception as e:
+            logger.exception("Unexpected error while sending message to group %s", gid)
+            res = {'success': False, 'group_id': gid, 'status_code': None, 'error': str(e)}
+        chat_health.observe_send(env, gid, res.get('status_code'))
+        if idempotency_key:
+            try:
+                send_ledger.record(env, idempotency_key, gid, res)
+            except Exception:
+                logger.exception("Failed to record delivery to group %s in the send ledger", gid)
+        return res
 
-            res = send_message_to_group(gid, message_body, image_url)
+    outcomes = []
+    complete = False
+    try:
+        yield from replayed
+        for (bid, slot, gid, floor_number, _text), res in send_dispatcher.imap_unordered(_send, jobs):
             entry = {
                 'group_id': gid,
                 'floor_number': floor_number,
@@ -197,33 +1250,175 @@ def send_messages():
                 'status_code': res.get('status_code'),
                 'error': res.get('error'),
             }
-            building_entry['results'].append(entry)
-            if entry['success']:
-                overall_successes += 1
-            else:
-                overall_failures += 1
+            outcomes.append((bid, entry))
+            yield bid, slot, entry
+        complete = True
+    finally:
+        broadcast = {
+            '_id': uuid.uuid4().hex,
+            'env': env,
+            'created_at': started_at,
+            'finished_at': time.time(),
+            'source': source,
+            'job_id': job_id,
+            'idempotency_key': idempotency_key,
+            'message_body': message_body,
+            'image_url': image_url,
+            'building_ids': list(group_map),
+            # Groups sent this time; sent + failed == total unless the broadcast was cut short.
+            # Groups already delivered under the idempotency key are counted in replayed only,
+            # so the earlier attempt's history is not counted twice.
+            'total': len(jobs),
+            'sent': sum(1 for _bid, entry in outcomes if entry['success']),
+            'failed': sum(1 for _bid, entry in outcomes if not entry['success']),
+            'replayed': len(replayed),
+            # False when a streaming client went away before every send finished
+            'complete': complete,
+        }
+        _record_broadcast_history(broadcast, [delivery_row(broadcast, bid, entry) for bid, entry in outcomes])
+
+    broadcast_fanout_groups.observe(len(jobs))
+    logger.info("Broadcast delivered to %d groups (%d replayed from the send ledger); GroupMe client stats: %s",
+                len(jobs), len(replayed), groupme_client.stats())
+
+
+def _record_broadcast_history(broadcast, deliveries):
+    """Store a finished broadcast; failures are logged, never raised into the send path."""
+    try:
+        broadcast_history.record(broadcast, deliveries)
+    except Exception:
+        logger.exception("Failed to record broadcast %s in the history", broadcast['_id'])
+
 
+def deliver_to_group_map(group_map, message_body, image_url=None, on_result=None, idempotency_key=None,
+                         source='request', job_id=None):
+    """Send to every group in ``group_map`` and collect the per-building results.
+
+    Results are slotted back into building order, so the returned
+    ``per_building_results`` matches what a sequential loop would build.
+    If given, ``on_result(building_id, entry)`` is called as each send finishes.
+    ``idempotency_key``, ``source`` and ``job_id`` are passed to ``iter_group_sends``.
+
+    Returns ``(per_building_results, successes, failures)``.
+    """
+    per_building_results = []
+    buildings = {}
+    for bid, group_entries in group_map.items():
+        building_entry = {
+            'building_id': bid,
+            'building_name': building_registry.name(bid),
+            'results': [None] * len(group_entries),
+        }
+        buildings[bid] = building_entry
         per_building_results.append(building_entry)
 
+    overall_successes = 0
+    overall_failures = 0
+    for bid, slot, entry in iter_group_sends(group_map, message_body, image_url, idempotency_key, source, job_id):
+        buildings[bid]['results'][slot] = entry
+        if entry['success']:
+            overall_successes += 1
+        else:
+            overall_failures += 1
+        if on_result is not None:
+            on_result(bid, entry)
+
+    return per_building_results, overall_successes, overall_failures
+
+
+def stream_send_results(group_map, message_body, image_url=None, idempotency_key=None):
+    """Yield NDJSON lines for a broadcast: one per group as it finishes, then a summary.
+
+    Result lines look like ``{"type": "result", "building_id", "building_name",
+    "group_id", "floor_number", "success", "status_code", "error"}``. The last
+    line is ``{"type": "summary", "message", "summary", "status_code"}``, where
+    ``status_code`` is what the buffered endpoint would have returned.
+    """
+    overall_successes = 0
+    overall_failures = 0
+    for bid, _slot, entry in iter_group_sends(group_map, message_body, image_url, idempotency_key, source='stream'):
+        if entry['success']:
+            overall_successes += 1
+        else:
+            overall_failures += 1
+        line = {'type': 'result', 'building_id': bid, 'building_name': building_registry.name(bid), **entry}
+        yield json.dumps(line, separators=(',', ':')) + '\n'
+
+    body, status_code = summarize_send_results(None, overall_successes, overall_failures)
+    body.pop('per_building', None)
+    body['summary'] = {
+        'total': overall_successes + overall_failures,
+        'sent': overall_successes,
+        'failed': overall_failures,
+    }
+    body.update(type='summary', status_code=status_code)
+    yield json.dumps(body, separators=(',', ':')) + '\n'
+
+
+def summarize_send_results(per_building_results, overall_successes, overall_failures):
+    """Return the ``(body, status_code)`` for a finished broadcast."""
     total = overall_successes + overall_failures
     if total == 0:
-        return jsonify({'message': 'No group chats found', 'per_building': per_building_results}), 404
+        return {'message': 'No group chats found', 'per_building': per_building_results}, 404
 
     if overall_failures == 0:
-        return jsonify({'message': 'All messages sent successfully', 'per_building': per_building_results}), 200
+        return {'message': 'All messages sent successfully', 'per_building': per_building_results}, 200
     elif overall_successes > 0:
-        return jsonify({
+        return {
             'message': 'Some messages were sent successfully',
             'summary': {'total': total, 'sent': overall_successes, 'failed': overall_failures},
             'per_building': per_building_results,
-        }), 207
+        }, 207
+    else:
+        return {'message': 'No messages were sent', 'per_building': per_building_results}, 502
+
+
+def build_send_response(per_building_results, overall_successes, overall_failures):
+    """Build the JSON response and status code for a finished broadcast."""
+    body, status_code = summarize_send_results(per_building_results, overall_successes, overall_failures)
+    return jsonify(body), status_code
+
+
+def _execute_broadcast_job(job, report):
+    """Deliver a queued broadcast job; used by ``broadcast_job_runner``."""
+    job_request = job['request']
+    if job_request.get('recipients'):
+        group_map = group_map_from_rows(job_request['recipients'])
     else:
-        return jsonify({'message': 'No messages were sent', 'per_building': per_building_results}), 502
+        group_map = get_groupme_map_by_buildings(job_request['building_ids'])
+    per_building_results, overall_successes, overall_failures = deliver_to_group_map(
+        group_map,
+        job_request['message_body'],
+        job_request.get('image_url'),
+        on_result=lambda bid, entry: report(int(entry['success']), int(not entry['success'])),
+        idempotency_key=job_request.get('idempotency_key'),
+        source='job',
+        job_id=job['_id'],
+    )
+    return summarize_send_results(per_building_results, overall_successes, overall_failures)
+
+
+# In-process worker pool for broadcasts submitted in job mode; wired to storage in init_app
+broadcast_job_runner = BroadcastJobRunner(
+    broadcast_jobs, _execute_broadcast_job, workers=Config.BROADCAST_JOB_WORKERS, lease=Config.BROADCAST_JOB_LEASE,
+)
+# Starts scheduled (send_at) broadcasts on the runner when they fall due; started in init_app
+broadcast_scheduler = BroadcastScheduler(
+    broadcast_jobs, broadcast_job_runner, refresh_interval=Config.BROADCAST_SCHEDULE_REFRESH
+)
 
 
 @app.route('/api/buildings', methods=['GET'])
 def get_buildings():
-    return jsonify({'buildings': buildings_data}), 200
+    building_registry.maybe_reload()
+    # The ETag is precomputed per buildings file, so a cache hit needs no serialization at all
+    if request.if_none_match.contains_weak(building_registry.etag):
+        response = app.response_class(status=304)
+        response.set_etag(building_registry.etag)
+        return response
+    response = app.response_class(building_registry.payload, mimetype='application/json')
+    response.set_etag(building_registry.etag)
+    return response, 200
 
 
 @app.route('/api/auth', methods=['POST'])
@@ -237,8 +1432,28 @@ def auth():
     else:
         return jsonify({'error': 'Unauthorized'}), 401
 
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+
+def _hash_image_stream(stream):
+    """Return the SHA-256 hex digest of ``stream`` read in chunks, rewound afterwards."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(IMAGE_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+@timed(groupme_call_seconds, labels={'endpoint': 'upload_image'}, status=lambda url: 'ok' if url else 'failed')
 def upload_image_to_groupme(image_file):
-    url = 'https://image.groupme.com/pictures'
+    """Upload an image to the GroupMe image service and return its picture_url.
+
+    The file is streamed to GroupMe from Werkzeug's spooled upload instead of
+    being read into memory, and images already uploaded by this worker (same
+    SHA-256) are served from ``image_cache`` without another upload.
+    """
+    url = f'{GROUPME_IMAGE_URL}/pictures'
     headers = {
         'X-Access-Token': app.config.get('GROUPME_ACCESS_TOKEN'),
         'Content-Type': image_file.content_type  # Use the uploaded file's content type
@@ -248,15 +1463,28 @@ def upload_image_to_groupme(image_file):
         logger.error("GROUPME_ACCESS_TOKEN not configured; cannot upload image")
         return None
 
+    stream = image_file.stream
+    digest = _hash_image_stream(stream) if stream.seekable() else None
+    if digest is not None:
+        cached_url = image_cache.get(digest)
+        if cached_url:
+            logger.info("Reusing previously uploaded image %s", digest[:12])
+            return cached_url
+
     try:
-        response = requests.post(url, headers=headers, data=image_file.read(), timeout=10)
+        # requests sends a file object in blocks with a Content-Length taken from the file
+        response = groupme_client.post(url, headers=headers, data=stream)
         response.raise_for_status()
         response_json = response.json()
-        return response_json.get('payload', {}).get('picture_url')
-    except requests.RequestException as e:
+        picture_url = response_json.get('payload', {}).get('picture_url')
+    except (requests.RequestException, ValueError) as e:
         logger.exception("Failed to upload image to GroupMe: %s", e)
         return None
 
+    if picture_url and digest is not None:
+        image_cache.put(digest, picture_url)
+    return picture_url
+
 # Helper function to extract group_id and share_token from GroupMe link
 def extract_group_id_and_token_from_link(link):
     # Example link: https://groupme.com/join_group/12345678/SHARE_TOKEN
@@ -270,6 +1498,7 @@ def extract_group_id_and_token_from_link(link):
         return None
 
 # Helper function to join a group using the GroupMe API
+@timed(groupme_call_seconds, labels={'endpoint': 'join_group'}, status=lambda ok: 'ok' if ok else 'failed')
 def join_group(group_id, share_token):
     url = f'{GROUPME_API_URL}/groups/{group_id}/join/{share_token}'
     token = app.config.get('GROUPME_ACCESS_TOKEN')
@@ -279,7 +1508,7 @@ def join_group(group_id, share_token):
 
     params = {'token': token}
     try:
-        response = requests.post(url, params=params, timeout=10)
+        response = groupme_client.post(url, params=params)
         if response.status_code in (200, 201):
             logger.info("Successfully joined group %s", group_id)
             return True
@@ -290,7 +1519,45 @@ def join_group(group_id, share_token):
         logger.exception("Network error while joining group %s", group_id)
         return False
 
+# Helper function to check whether a group still exists and the bot is still in it
+@timed(groupme_call_seconds, labels={'endpoint': 'get_group'}, status=lambda ok: {True: 'ok', False: 'gone'}.get(ok, 'unknown'))
+def check_group(group_id):
+    """Return True if GroupMe serves the group, False on 403/404, or None if it cannot tell."""
+    token = app.config.get('GROUPME_ACCESS_TOKEN')
+    if not token:
+        return None
+    health_rate_limiter.acquire()
+    try:
+        response = groupme_client.get(f'{GROUPME_API_URL}/groups/{group_id}', params={'token': token})
+    except requests.RequestException:
+        logger.warning("Network error while checking group %s", group_id)
+        return None
+    if response.status_code == 200:
+        return True
+    if response.status_code in DEAD_STATUS_CODES:
+        return False
+    logger.warning("Unexpected status %s while checking group %s", response.status_code, group_id)
+    return None
+
+
+# Tracks send failures and sweeps stored chats, marking dead groups inactive; started in init_app
+chat_health = ChatHealthMonitor(
+    lambda: chat_store,
+    check_group,
+    health_dispatcher,
+    interval=Config.CHAT_HEALTH_SWEEP_INTERVAL,
+    dead_after=Config.CHAT_DEAD_AFTER_FAILURES,
+)
+
+
+# Helper function to look up a stored chat for the active environment
+@timed(storage_query_seconds, labels={'backend': _storage_backend, 'operation': 'find_chat'})
+def find_chat(groupme_id):
+    return chat_store.find_chat(app.config.get('APP_ENV'), groupme_id)
+
+
 # Helper function to add a chat to the database
+@timed(storage_query_seconds, labels={'backend': _storage_backend, 'operation': 'add_chat'})
 def add_chat(groupme_id, building_id, floor_number):
     chat = {
         'groupme_id': groupme_id,
@@ -299,41 +1566,30 @@ def add_chat(groupme_id, building_id, floor_number):
         # Tag the chat with the application environment to avoid mixing dev/prod data
         'env': app.config.get('APP_ENV')
     }
-    if chats_collection is not None:
-        try:
-            result = chats_collection.insert_one(chat)
-            if result.inserted_id:
-                chat['_id'] = str(result.inserted_id)
-                logger.info("Chat added to database: %s", chat)
-                return chat
-        except Exception:
-            logger.exception("Failed to insert chat into MongoDB")
-            return None
-    else:
-        # Fallback in-memory storage (development / offline mode)
-        _fallback_chats.append(chat)
-        logger.info("Chat added to in-memory storage: %s", chat)
-        return chat
+    try:
+        chat = chat_store.add_chat(chat)
+    except DuplicateChatError:
+        logger.info("GroupMe ID already exists in storage: %s", groupme_id)
+        return None
+    except Exception:
+        logger.exception("Failed to insert chat into %s storage", chat_store.name)
+        return None
+    logger.info("Chat added to %s storage: %s", chat_store.name, chat)
+    return chat
 
 
 # Helper function to get groupme_ids by building IDs
+@timed(storage_query_seconds, labels={'backend': _storage_backend, 'operation': 'groupme_ids_by_buildings'})
 def get_groupme_ids_by_buildings(building_ids):
-    groupme_ids = []
-    if chats_collection is not None:
-        try:
-            # Filter by active environment
-            chats = chats_collection.find({'building_id': {'$in': building_ids}, 'env': app.config.get('APP_ENV')})
-            for chat in chats:
-                groupme_ids.append(chat['groupme_id'])
-        except Exception:
-            logger.exception("Error querying chats from MongoDB; returning empty list")
-            return []
-    else:
-        groupme_ids = [c['groupme_id'] for c in _fallback_chats if c.get('building_id') in building_ids and c.get('env') == app.config.get('APP_ENV')]
-
-    return groupme_ids
+    try:
+        # Filter by active environment
+        return chat_store.groupme_ids_by_buildings(app.config.get('APP_ENV'), building_ids)
+    except Exception:
+        logger.exception("Error querying chats from %s storage; returning empty list", chat_store.name)
+        return []
 
 
+@timed(storage_query_seconds, labels={'backend': _storage_backend, 'operation': 'map_by_buildings'})
 def get_groupme_map_by_buildings(building_ids):
     """Return a mapping of building_id -> list of group entries.
 
@@ -343,34 +1599,26 @@ def get_groupme_map_by_buildings(building_ids):
 
     This preserves backward compatibility (values may still be plain group_id strings
     when older code populates the structure), but new code will return rich entries.
+    Entries may be shared with the storage cache; treat them as read-only.
+    Chats marked inactive by ``chat_health`` are left out.
     """
-    mapping = {bid: [] for bid in building_ids}
-    if chats_collection is not None:
-        try:
-            # Filter by the active application environment
-            chats = chats_collection.find({'building_id': {'$in': building_ids}, 'env': app.config.get('APP_ENV')})
-            for chat in chats:
-                bid = chat.get('building_id')
-                gid = chat.get('groupme_id')
-                floor = chat.get('floor_number')
-                if bid in mapping:
-                    mapping[bid].append({'group_id': gid, 'floor_number': floor})
-        except Exception:
-            logger.exception("Error querying chats from MongoDB for mapping; returning empty mapping")
-            return mapping
-    else:
-        for c in _fallback_chats:
-            # Respect environment when using fallback storage
-            if c.get('env') != app.config.get('APP_ENV'):
-                continue
-            bid = c.get('building_id')
-            if bid in mapping:
-                mapping[bid].append({'group_id': c.get('groupme_id'), 'floor_number': c.get('floor_number')})
-
-    return mapping
+    try:
+        # Filter by the active application environment
+        return chat_store.map_by_buildings(app.config.get('APP_ENV'), building_ids)
+    except Exception:
+        logger.exception("Error querying chats from %s storage for mapping; returning empty mapping", chat_store.name)
+        return {bid: [] for bid in building_ids}
 
 # Function to send a message directly to a GroupMe group
-def send_message_to_group(group_id, text, image_url=None):
+@timed(groupme_call_seconds, labels={'endpoint': 'send_message'}, status=lambda r: r.get('status_code') or 'error')
+@track_in_flight(sends_in_flight)
+def send_message_to_group(group_id, text, image_url=None, source_guid=None):
+    """Send one message, waiting on the rate limiter and retrying transient failures.
+
+    429, 5xx and network errors are retried with jittered exponential backoff
+    (``Retry-After`` wins when GroupMe sends one). Every attempt reuses the same
+    ``source_guid`` so GroupMe drops duplicates if an earlier attempt did land.
+    """
     url = f'{GROUPME_API_URL}/groups/{group_id}/messages'
     token = app.config.get('GROUPME_ACCESS_TOKEN')
     if not token:
@@ -380,7 +1628,7 @@ def send_message_to_group(group_id, text, image_url=None):
     params = {'token': token}
     message_data = {
         'message': {
-            'source_guid': str(uuid.uuid4()),
+            'source_guid': source_guid or str(uuid.uuid4()),
             'text': text,
         }
     }
@@ -391,21 +1639,45 @@ def send_message_to_group(group_id, text, image_url=None):
                 'url': image_url
             }
         ]
-    try:
-        response = requests.post(url, params=params, json=message_data, timeout=10)
-        if response.status_code != 201:
-            logger.error("Failed to send message to group %s: %s %s", group_id, response.status_code, response.text)
+
+    attempts = 0
+    while True:
+        attempts += 1
+        send_rate_limiter.acquire(group_id)
+        retry_after = None
+        try:
+            response = groupme_client.post(url, params=params, json=message_data)
+        except requests.RequestException as e:
+            status_code, error = None, str(e)
+        else:
+            if response.status_code == 201:
+                logger.info("Message sent to group %s", group_id)
+                return {'success': True, 'group_id': group_id, 'status_code': response.status_code, 'attempts': attempts}
+            status_code, error = response.status_code, response.text
+            if status_code == 429:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+        retryable = status_code is None or status_code in RETRYABLE_STATUS_CODES
+        if not retryable or attempts > send_retry_policy.max_retries:
+            if status_code is None:
+                logger.error("Network error while sending message to group %s after %d attempts: %s", group_id, attempts, error)
+            else:
+                logger.error("Failed to send message to group %s: %s %s", group_id, status_code, error)
             return {
                 'success': False,
                 'group_id': group_id,
-                'status_code': response.status_code,
-                'error': response.text,
+                'status_code': status_code,
+                'error': error,
+                'attempts': attempts,
             }
-        logger.info("Message sent to group %s", group_id)
-        return {'success': True, 'group_id': group_id, 'status_code': response.status_code}
-    except requests.RequestException as e:
-        logger.exception("Network error while sending message to group %s", group_id)
-        return {'success': False, 'group_id': group_id, 'status_code': None, 'error': str(e)}
+
+        delay = send_retry_policy.delay(attempts, retry_after)
+        if status_code == 429:
+            # Rate limited: hold back every sender in this process, not just this one
+            send_rate_limiter.pause(delay)
+        logger.warning("Retrying message to group %s in %.2fs (attempt %d, status %s)",
+                       group_id, delay, attempts, status_code)
+        time.sleep(delay)
 
 if __name__ == '__main__':
     # Configure debug mode via FLASK_DEBUG env var (truthy values enable debug)
@@ -0,0 +1,89 @@
+"""Compare chat storage backends side by side.
+
+Seeds the same synthetic roster into each backend and times inserts, the
+duplicate check and broadcast recipient lookups. The mongo backend is only
+included when MONGODB_URI is set; it writes to a throwaway ``bench_<pid>``
+database that is dropped afterwards.
+
+    python bench_storage.py --buildings 40 --floors 12
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from config import Config
+from storage import create_chat_store
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+ENV = 'bench'
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"  {label:<22} median {statistics.median(samples):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def run_backend(name, store, buildings, floors, repeat):
+    chats = [
+        {'groupme_id': f'{b}-{f}', 'building_id': b, 'floor_number': f, 'env': ENV}
+        for b in range(buildings) for f in range(floors)
+    ]
+    print(f"{name}: {len(chats)} chats")
+
+    start = time.perf_counter()
+    store.add_chats(chats)
+    print(f"  {'batched insert':<22} {(time.perf_counter() - start) * 1000:8.3f} ms total")
+
+    all_ids = list(range(buildings))
+    region = random.sample(all_ids, max(1, buildings // 3))
+    _report('duplicate check', _timed(lambda: store.find_chat(ENV, f'{random.randrange(buildings)}-0'), repeat))
+    _report('region lookup', _timed(lambda: store.map_by_buildings(ENV, region), repeat))
+    _report('campus-wide lookup', _timed(lambda: store.map_by_buildings(ENV, all_ids), repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buildings', type=int, default=40)
+    parser.add_argument('--floors', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    run_backend('memory', create_chat_store('memory'), args.buildings, args.floors, args.repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = create_chat_store('sqlite', sqlite_path=os.path.join(tmp, 'bench.sqlite3'))
+        run_backend('sqlite', store, args.buildings, args.floors, args.repeat)
+
+    if Config.MONGODB_URI:
+        from pymongo import MongoClient
+
+        client = MongoClient(Config.MONGODB_URI, **Config.MONGODB_CLIENT_OPTIONS())
+        dbname = f'bench_{os.getpid()}'
+        try:
+            store = create_chat_store('mongo', db=client[dbname])
+            store.ensure_indexes()
+            run_backend('mongo', store, args.buildings, args.floors, args.repeat)
+        finally:
+            client.drop_database(dbname)
+    else:
+        print("mongo: skipped (MONGODB_URI not set)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+# cache.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class RecipientCache:
+    """Process-local cache of the chat roster (building_id -> group entries) per env.
+
+    ``load(env)`` fetches the full roster for an environment. Entries are
+    dropped explicitly via ``invalidate`` (write-through from ``add_chat``) and
+    expire after ``ttl`` seconds as a safety net.
+
+    Other worker processes are kept in sync with an optional version counter:
+    ``get_version(env)`` returns a number that writers bump after every change.
+    It is checked at most every ``version_check_interval`` seconds, and a
+    changed value forces a reload.
+
+    If a reload fails (e.g. MongoDB is briefly unreachable) the stale roster is
+    served and the error is logged, so broadcasts keep working through short
+    outages.
+    """
+
+    def __init__(self, load, ttl: float = 300.0, get_version=None, version_check_interval: float = 5.0):
+        self.load = load
+        self.ttl = ttl
+        self.get_version = get_version
+        self.version_check_interval = version_check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def _current_version(self, env):
+        if self.get_version is None:
+            return None
+        return self.get_version(env)
+
+    def _is_fresh(self, entry, now) -> bool:
+        if entry is None or now - entry['loaded_at'] >= self.ttl:
+            return False
+        if self.get_version is None or now - entry['checked_at'] < self.version_check_interval:
+            return True
+        try:
+            version = self._current_version(entry['env'])
+        except Exception:
+            logger.warning("Could not check recipient cache version for env=%s; using cached roster",
+                           entry['env'], exc_info=True)
+            entry['checked_at'] = now
+            return True
+        entry['checked_at'] = now
+        return version == entry['version']
+
+    def get(self, env) -> dict:
+        """Return the roster for ``env``, reloading it if missing, expired or stale."""
+        entry = self._entries.get(env)
+        if self._is_fresh(entry, time.monotonic()):
+            return entry['roster']
+
+        with self._reload_lock:
+            current = self._entries.get(env)
+            if current is not None and current is not entry:
+                # Another thread reloaded while we waited for the lock
+                return current['roster']
+            now = time.monotonic()
+            try:
+                version = self._current_version(env)
+                roster = self.load(env)
+            except Exception:
+                if entry is None:
+                    raise
+                logger.warning("Failed to reload recipients for env=%s; serving cached roster", env, exc_info=True)
+                entry['checked_at'] = now
+                return entry['roster']
+            entry = {'env': env, 'roster': roster, 'version': version, 'loaded_at': now, 'checked_at': now}
+            with self._lock:
+                self._entries[env] = entry
+            return roster
+
+    def invalidate(self, env=None) -> None:
+        with self._lock:
+            if env is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(env, None)
+
+
+class ImageCache:
+    """Content hash -> GroupMe ``picture_url`` map with LRU size and TTL eviction.
+
+    Lets a re-sent flyer reuse the URL from its first upload instead of
+    uploading the same bytes again.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 86400.0):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            url, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return url
+
+    def put(self, digest, url) -> None:
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[digest] = (url, time.monotonic() + self.ttl)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
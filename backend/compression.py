@@ -0,0 +1,92 @@
+# compression.py
+import gzip
+import logging
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli  # optional: pip install brotli to also serve Content-Encoding: br
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Text responses worth compressing; images and NDJSON streams are left alone
+COMPRESSIBLE_MIMETYPES = frozenset({'application/json', 'text/plain', 'text/csv', 'text/html'})
+
+
+class ResponseCompressor:
+    """gzip/brotli encoding for buffered text responses at or above ``min_size`` bytes.
+
+    The encoding is picked from ``Accept-Encoding`` (brotli only when the
+    ``brotli`` package is installed). Responses that carry an ETag are
+    compressed once per ``(etag, encoding)`` and then served from a small LRU,
+    so unchanged payloads such as the buildings list cost no CPU after their
+    first request. A compressed response's ETag is made weak, because its
+    bytes differ from the identity encoding.
+
+    Streamed responses, file passthroughs and responses that already have a
+    ``Content-Encoding`` are never touched.
+    """
+
+    def __init__(self, min_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4, cache_entries: int = 64):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def encodings(self) -> list:
+        return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    def _compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level)
+
+    def _cached(self, key):
+        with self._lock:
+            data = self._cache.get(key)
+            if data is not None:
+                self._cache.move_to_end(key)
+            return data
+
+    def _store(self, key, data) -> None:
+        with self._lock:
+            self._cache[key] = data
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def process(self, response, accept_encodings):
+        """Compress ``response`` in place if the client and the payload allow it."""
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = accept_encodings.best_match(self.encodings)
+        if not encoding:
+            return response
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        key = (etag, encoding) if etag and not weak and self.cache_entries else None
+        compressed = self._cached(key) if key else None
+        if compressed is None:
+            compressed = self._compress(data, encoding)
+            if key:
+                self._store(key, compressed)
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
@@ -19,6 +19,9 @@ class Config:
     """
 
     GROUPME_ACCESS_TOKEN: str | None = os.getenv('GROUPME_ACCESS_TOKEN')
+    # GroupMe API base URLs; overridable so load tests can point at a local stand-in server
+    GROUPME_API_URL: str = os.getenv('GROUPME_API_URL', 'https://api.groupme.com/v3')
+    GROUPME_IMAGE_URL: str = os.getenv('GROUPME_IMAGE_URL', 'https://image.groupme.com')
     SECRET_KEY: str | None = os.getenv('SECRET_KEY')
     # Accept EXECUTIVE_PASSWORD or fallback to REACT_APP_EXECUTIVE_PASSWORD for local dev compatibility
     EXECUTIVE_PASSWORD: str | None = os.getenv('EXECUTIVE_PASSWORD') or os.getenv('REACT_APP_EXECUTIVE_PASSWORD')
@@ -34,6 +37,103 @@ class Config:
     MONGODB_DB_DEV: str | None = os.getenv('MONGODB_DB_DEV')
     MONGODB_DB_PROD: str | None = os.getenv('MONGODB_DB_PROD')
 
+    # MongoClient pool and timeouts. Workers connect in the background and retry with
+    # jittered backoff (seconds) until MongoDB answers, then re-check every MONGODB_HEALTH_INTERVAL.
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv('MONGODB_MAX_POOL_SIZE', '50'))
+    MONGODB_MIN_POOL_SIZE: int = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+    MONGODB_CONNECT_TIMEOUT_MS: int = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '5000'))
+    MONGODB_SOCKET_TIMEOUT_MS: int = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', '0'))
+    MONGODB_MAX_IDLE_TIME_MS: int = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', '0'))
+    MONGODB_RECONNECT_BACKOFF_BASE: float = float(os.getenv('MONGODB_RECONNECT_BACKOFF_BASE', '1'))
+    MONGODB_RECONNECT_BACKOFF_MAX: float = float(os.getenv('MONGODB_RECONNECT_BACKOFF_MAX', '60'))
+    MONGODB_HEALTH_INTERVAL: float = float(os.getenv('MONGODB_HEALTH_INTERVAL', '15'))
+
+    # Chat storage backend: 'mongo', 'sqlite' or 'memory'. Defaults to mongo when
+    # MONGODB_URI is set, otherwise memory. SQLITE_PATH is the database file for sqlite.
+    STORAGE_BACKEND: str | None = os.getenv('STORAGE_BACKEND')
+    SQLITE_PATH: str = os.getenv('SQLITE_PATH', 'rhac.sqlite3')
+
+    # Buildings file and how often (seconds) to check it for changes on disk
+    BUILDINGS_FILE: str = os.getenv('BUILDINGS_FILE', 'buildings.json')
+    BUILDINGS_RELOAD_INTERVAL: float = float(os.getenv('BUILDINGS_RELOAD_INTERVAL', '5'))
+
+    # Chat roster cache for broadcast recipient lookups: lifetime in seconds, and how
+    # often (seconds) to check the shared version counter for changes made by other workers
+    RECIPIENT_CACHE_TTL: float = float(os.getenv('RECIPIENT_CACHE_TTL', '300'))
+    RECIPIENT_CACHE_VERSION_CHECK: float = float(os.getenv('RECIPIENT_CACHE_VERSION_CHECK', '5'))
+
+    # Maximum number of GroupMe sends in flight at once per process during a broadcast
+    SEND_MAX_IN_FLIGHT: int = int(os.getenv('SEND_MAX_IN_FLIGHT', '16'))
+
+    # Bulk chat import: concurrent group joins per request and maximum rows per request
+    BULK_JOIN_MAX_IN_FLIGHT: int = int(os.getenv('BULK_JOIN_MAX_IN_FLIGHT', '8'))
+    BULK_IMPORT_MAX_ROWS: int = int(os.getenv('BULK_IMPORT_MAX_ROWS', '1000'))
+
+    # Chat health: seconds between background sweeps of every chat against the GroupMe
+    # groups API (0 disables), concurrent lookups per sweep, and how many consecutive
+    # 403/404 send results mark a chat inactive
+    CHAT_HEALTH_SWEEP_INTERVAL: float = float(os.getenv('CHAT_HEALTH_SWEEP_INTERVAL', '21600'))
+    CHAT_HEALTH_MAX_IN_FLIGHT: int = int(os.getenv('CHAT_HEALTH_MAX_IN_FLIGHT', '4'))
+    # Group lookups per second during a sweep, separate from the send rate limit (0 disables)
+    CHAT_HEALTH_RATE_LIMIT: float = float(os.getenv('CHAT_HEALTH_RATE_LIMIT', '0'))
+    CHAT_DEAD_AFTER_FAILURES: int = int(os.getenv('CHAT_DEAD_AFTER_FAILURES', '3'))
+
+    # Shared GroupMe HTTP client: number of per-host pools, kept-alive connections
+    # per host, whether to wait for a free connection when a host's pool is full,
+    # and the per-request timeout in seconds
+    GROUPME_POOL_CONNECTIONS: int = int(os.getenv('GROUPME_POOL_CONNECTIONS', '4'))
+    GROUPME_POOL_MAXSIZE: int = int(os.getenv('GROUPME_POOL_MAXSIZE', '16'))
+    GROUPME_POOL_BLOCK: bool = os.getenv('GROUPME_POOL_BLOCK', 'true').lower() in ('1', 'true', 'yes', 'on')
+    GROUPME_TIMEOUT: float = float(os.getenv('GROUPME_TIMEOUT', '10'))
+
+    # Outbound send rate limits (token buckets, tokens per second; 0 disables) applied
+    # across the whole process and to each group, plus retry/backoff for 429, 5xx and
+    # network errors. Burst defaults to the rate when unset. Both limits are off by
+    # default: SEND_MAX_IN_FLIGHT bounds concurrency and 429s are retried with Retry-After.
+    GROUPME_RATE_LIMIT: float = float(os.getenv('GROUPME_RATE_LIMIT', '0'))
+    GROUPME_RATE_BURST: float | None = float(os.getenv('GROUPME_RATE_BURST')) if os.getenv('GROUPME_RATE_BURST') else None
+    GROUPME_GROUP_RATE_LIMIT: float = float(os.getenv('GROUPME_GROUP_RATE_LIMIT', '0'))
+    GROUPME_GROUP_RATE_BURST: float | None = float(os.getenv('GROUPME_GROUP_RATE_BURST')) if os.getenv('GROUPME_GROUP_RATE_BURST') else None
+    GROUPME_MAX_RETRIES: int = int(os.getenv('GROUPME_MAX_RETRIES', '3'))
+    GROUPME_BACKOFF_BASE: float = float(os.getenv('GROUPME_BACKOFF_BASE', '0.5'))
+    GROUPME_BACKOFF_MAX: float = float(os.getenv('GROUPME_BACKOFF_MAX', '30'))
+
+    # Uploaded image dedup cache: maximum remembered images and their lifetime in seconds
+    IMAGE_CACHE_MAX_ENTRIES: int = int(os.getenv('IMAGE_CACHE_MAX_ENTRIES', '256'))
+    IMAGE_CACHE_TTL: float = float(os.getenv('IMAGE_CACHE_TTL', '86400'))
+
+    # Response compression: minimum body size in bytes (0 compresses everything, a negative
+    # value disables compression), gzip level, and brotli quality (brotli needs the
+    # optional 'brotli' package)
+    COMPRESS_MIN_SIZE: int = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_LEVEL: int = int(os.getenv('COMPRESS_LEVEL', '6'))
+    COMPRESS_BROTLI_QUALITY: int = int(os.getenv('COMPRESS_BROTLI_QUALITY', '4'))
+
+    # Request profiling: profile every request (otherwise only admin requests sending an
+    # X-Profile header), the default mode ('spans' or 'cprofile'), and profiles kept per worker
+    PROFILE_REQUESTS: bool = os.getenv('PROFILE_REQUESTS', 'false').lower() in ('1', 'true', 'yes', 'on')
+    PROFILE_MODE: str = os.getenv('PROFILE_MODE', 'spans').lower()
+    PROFILE_BUFFER_SIZE: int = int(os.getenv('PROFILE_BUFFER_SIZE', '50'))
+
+    # Optional bearer token required to scrape /api/metrics (open when unset)
+    METRICS_TOKEN: str | None = os.getenv('METRICS_TOKEN')
+
+    # Background worker threads per process for broadcasts submitted in job mode
+    BROADCAST_JOB_WORKERS: int = int(os.getenv('BROADCAST_JOB_WORKERS', '2'))
+    # Seconds a running broadcast job may go without a worker heartbeat before a
+    # restarting worker treats it as abandoned
+    BROADCAST_JOB_LEASE: float = float(os.getenv('BROADCAST_JOB_LEASE', '300'))
+    # Seconds between re-syncs of the scheduled-broadcast queue with storage (picks up
+    # broadcasts scheduled by other worker processes)
+    BROADCAST_SCHEDULE_REFRESH: float = float(os.getenv('BROADCAST_SCHEDULE_REFRESH', '60'))
+
+    # How long, in seconds, a recipient plan from /api/messages/plan stays usable
+    BROADCAST_PLAN_TTL: float = float(os.getenv('BROADCAST_PLAN_TTL', '900'))
+
+    # How long, in seconds, per-group delivery records for idempotent broadcasts are kept
+    SEND_LEDGER_TTL: float = float(os.getenv('SEND_LEDGER_TTL', str(7 * 86400)))
+
     @classmethod
     def MONGODB_DB_NAME(cls) -> str:
         """Return the database name appropriate for the current ENV.
@@ -53,6 +153,24 @@ class Config:
             return cls.MONGODB_DB
         return 'rhac_db'
 
+    @classmethod
+    def MONGODB_CLIENT_OPTIONS(cls) -> dict:
+        """Return MongoClient keyword arguments for the pool and timeout settings.
+
+        Socket and idle timeouts of 0 are left out so the driver defaults (no limit) apply.
+        """
+        options = {
+            'maxPoolSize': cls.MONGODB_MAX_POOL_SIZE,
+            'minPoolSize': cls.MONGODB_MIN_POOL_SIZE,
+            'serverSelectionTimeoutMS': cls.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            'connectTimeoutMS': cls.MONGODB_CONNECT_TIMEOUT_MS,
+        }
+        if cls.MONGODB_SOCKET_TIMEOUT_MS:
+            options['socketTimeoutMS'] = cls.MONGODB_SOCKET_TIMEOUT_MS
+        if cls.MONGODB_MAX_IDLE_TIME_MS:
+            options['maxIdleTimeMS'] = cls.MONGODB_MAX_IDLE_TIME_MS
+        return options
+
     @classmethod
     def validate(cls, *, fail_on_missing: bool = True) -> List[str]:
         """Validate environment configuration.
@@ -0,0 +1,76 @@
+# dispatcher.py
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher:
+    """Run blocking calls on a bounded, process-wide thread pool.
+
+    At most ``max_in_flight`` calls run at the same time; any extra work waits in
+    the pool's queue until a worker frees up. The executor is created lazily on
+    first use so importing this module (or forking gunicorn workers) does not
+    start any threads.
+    """
+
+    def __init__(self, max_in_flight: int = 16, name: str = 'dispatch'):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.name = name
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_in_flight,
+                        thread_name_prefix=self.name,
+                    )
+                    logger.info("Started %s pool with max_in_flight=%d", self.name, self.max_in_flight)
+        return self._executor
+
+    def configure(self, max_in_flight: int) -> None:
+        """Change the concurrency limit. Takes effect for work submitted afterwards."""
+        max_in_flight = max(1, int(max_in_flight))
+        if max_in_flight == self.max_in_flight:
+            return
+        with self._lock:
+            old = self._executor
+            self._executor = None
+            self.max_in_flight = max_in_flight
+        if old is not None:
+            # Let already-submitted work finish on the old pool
+            old.shutdown(wait=False)
+
+    def imap_unordered(self, fn, items):
+        """Yield ``(item, fn(item))`` pairs in completion order.
+
+        ``fn`` should handle its own errors; an exception raised by ``fn`` is
+        re-raised to the caller when its result is reached.
+        """
+        items = list(items)
+        if not items:
+            return
+        if len(items) == 1 or self.max_in_flight == 1:
+            # Nothing to overlap; skip the thread hop
+            for item in items:
+                yield item, fn(item)
+            return
+
+        executor = self._get_executor()
+        # Each call runs in a copy of the caller's context, so context variables
+        # such as the active request profile follow the work onto the pool
+        futures = {executor.submit(contextvars.copy_context().run, fn, item): item for item in items}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
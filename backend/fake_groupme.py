@@ -0,0 +1,199 @@
+"""Local stand-in for the GroupMe APIs, for load tests and offline development.
+
+Implements just the calls the backend makes:
+
+- ``POST /v3/groups/<id>/messages``     -> 201
+- ``POST /v3/groups/<id>/join/<token>`` -> 200
+- ``GET  /v3/groups/<id>``              -> 200
+- ``POST /pictures``                    -> 200 with a ``picture_url``
+
+Every response can be delayed (``latency`` +/- ``jitter`` seconds), and a
+fraction of calls can fail with a 500 (``error_rate``) or be rate limited with
+a 429 and ``Retry-After`` (``rate_limit_rate``). Group ids listed in
+``dead_groups`` always answer 404. Counters are kept so a harness can check
+how many calls, retries and duplicate ``source_guid`` values the server saw.
+
+Run standalone and point the backend at it:
+
+    python fake_groupme.py --port 8099 --latency 0.05 --error-rate 0.01
+    GROUPME_API_URL=http://127.0.0.1:8099/v3 GROUPME_IMAGE_URL=http://127.0.0.1:8099 python app.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_MESSAGE_PATH = re.compile(r'^/v3/groups/([^/]+)/messages$')
+_JOIN_PATH = re.compile(r'^/v3/groups/([^/]+)/join/([^/]+)$')
+_GROUP_PATH = re.compile(r'^/v3/groups/([^/]+)$')
+
+
+class FakeGroupMe:
+    """Threaded fake GroupMe server. Use as a context manager or call start()/stop()."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_limit_rate=0.0, retry_after=1, dead_groups=(), seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.dead_groups = set(dead_groups)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = Counter()
+        self.source_guids = Counter()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def api_url(self) -> str:
+        return f'{self.base_url}/v3'
+
+    @property
+    def duplicate_messages(self) -> int:
+        """Messages delivered more than once with the same source_guid."""
+        with self._lock:
+            return sum(n - 1 for n in self.source_guids.values() if n > 1)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-groupme', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _pick_fault(self):
+        with self._lock:
+            roll = self._random.random()
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+        if roll < self.rate_limit_rate:
+            return delay, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, 500
+        return delay, None
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=None, headers=None):
+                payload = json.dumps(body or {}).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _read_body(self) -> bytes:
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length) if length else b''
+
+            def _handle(self, method):
+                path = self.path.split('?', 1)[0]
+                body = self._read_body() if method == 'POST' else b''
+                delay, fault = fake._pick_fault()
+                if delay:
+                    time.sleep(delay)
+
+                if method == 'POST' and path == '/pictures':
+                    kind = 'upload'
+                elif method == 'POST' and _MESSAGE_PATH.match(path):
+                    kind = 'message'
+                elif method == 'POST' and _JOIN_PATH.match(path):
+                    kind = 'join'
+                elif method == 'GET' and _GROUP_PATH.match(path):
+                    kind = 'group'
+                else:
+                    fake._count('not_found')
+                    return self._reply(404, {'meta': {'code': 404, 'errors': ['not found']}})
+
+                fake._count(kind)
+                if fault == 429:
+                    fake._count('rate_limited')
+                    return self._reply(429, {'meta': {'code': 429}}, {'Retry-After': str(fake.retry_after)})
+                if fault == 500:
+                    fake._count('errors')
+                    return self._reply(500, {'meta': {'code': 500}})
+
+                group_id = path.split('/')[3] if path.startswith('/v3/groups/') else None
+                if group_id in fake.dead_groups:
+                    fake._count('dead')
+                    return self._reply(404, {'meta': {'code': 404, 'errors': ['group not found']}})
+
+                if kind == 'message':
+                    try:
+                        guid = json.loads(body or b'{}').get('message', {}).get('source_guid')
+                    except ValueError:
+                        guid = None
+                    if guid:
+                        with fake._lock:
+                            fake.source_guids[guid] += 1
+                    return self._reply(201, {'response': {'message': {'id': uuid.uuid4().hex}}})
+                if kind == 'upload':
+                    return self._reply(200, {'payload': {'picture_url': f'https://i.groupme.com/{uuid.uuid4().hex}'}})
+                return self._reply(200, {'response': {'id': group_id}})
+
+            def do_POST(self):
+                self._handle('POST')
+
+            def do_GET(self):
+                self._handle('GET')
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.05, help='mean response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.02, help='+/- delay jitter in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    args = parser.parse_args()
+
+    fake = FakeGroupMe(args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after)
+    print(f"Fake GroupMe listening on {fake.base_url} (API base {fake.api_url})")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(dict(fake.counts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+# groupme.py
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+class GroupMeClient:
+    """Shared HTTP client for every call to the GroupMe APIs.
+
+    Wraps a single ``requests.Session`` whose adapters keep connections alive
+    and pool them per host, so a broadcast pays for the TCP/TLS handshake once
+    per pooled connection rather than once per message.
+
+    - ``pool_connections``: number of distinct hosts to keep pools for
+    - ``pool_maxsize``: maximum kept-alive connections per host
+    - ``pool_block``: when True, callers wait for a free connection instead of
+      opening extra throwaway ones once a host's pool is exhausted
+
+    The session is created lazily and recreated after ``fork()`` so gunicorn
+    workers never share sockets with their parent.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16,
+                 pool_block: bool = True, timeout: float = 10):
+        self.pool_connections = max(1, int(pool_connections))
+        self.pool_maxsize = max(1, int(pool_maxsize))
+        self.pool_block = bool(pool_block)
+        self.timeout = timeout
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._connections_opened = 0
+
+    def configure(self, *, pool_connections=None, pool_maxsize=None, pool_block=None, timeout=None) -> None:
+        """Update pool settings. The current session is dropped and rebuilt on next use."""
+        with self._lock:
+            if pool_connections is not None:
+                self.pool_connections = max(1, int(pool_connections))
+            if pool_maxsize is not None:
+                self.pool_maxsize = max(1, int(pool_maxsize))
+            if pool_block is not None:
+                self.pool_block = bool(pool_block)
+            if timeout is not None:
+                self.timeout = timeout
+            self._close_session()
+
+    def _count_new_connection(self) -> None:
+        with self._lock:
+            self._connections_opened += 1
+
+    def _build_adapter(self) -> HTTPAdapter:
+        client = self
+
+        class _CountingHTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                client._count_new_connection()
+                return super()._new_conn()
+
+        class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                client._count_new_connection()
+                return super()._new_conn()
+
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        adapter.poolmanager.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+        return adapter
+
+    def _close_session(self) -> None:
+        if self._session is not None:
+            try:
+                self._session.close()
+            except Exception:
+                logger.debug("Error while closing GroupMe session", exc_info=True)
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self) -> requests.Session:
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    if self._pid != pid:
+                        # Inherited from a parent process: never reuse its sockets
+                        self._session = None
+                    session = requests.Session()
+                    adapter = self._build_adapter()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers['Connection'] = 'keep-alive'
+                    self._session = session
+                    self._pid = pid
+        return self._session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        with self._lock:
+            self._requests += 1
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> dict:
+        """Return request and connection counters for this process.
+
+        ``connections_reused`` is the number of requests that went out over an
+        already-open keep-alive connection.
+        """
+        with self._lock:
+            total = self._requests
+            opened = self._connections_opened
+        return {
+            'requests': total,
+            'connections_opened': opened,
+            'connections_reused': max(0, total - opened),
+            'pool_connections': self.pool_connections,
+            'pool_maxsize': self.pool_maxsize,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_session()
@@ -0,0 +1,127 @@
+# health.py
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Send/lookup statuses that mean the group is gone or the bot is no longer in it
+DEAD_STATUS_CODES = frozenset({403, 404})
+
+
+class ChatHealthMonitor:
+    """Marks chats inactive when their GroupMe group is gone, so broadcasts skip them.
+
+    Two signals feed it:
+
+    - ``observe_send(env, group_id, status_code)`` is called for every send
+      result. After ``dead_after`` consecutive 403/404 responses for a group,
+      the chat is marked inactive. Any success resets the count.
+    - ``sweep(env)`` checks every stored chat with ``check(group_id)``, which
+      returns True (group reachable), False (403/404) or None (unknown, e.g. a
+      timeout). Checks run concurrently on ``dispatcher``. Dead active chats are
+      deactivated; inactive chats that answer again are reactivated.
+
+    ``start(env)`` runs a sweep every ``interval`` seconds on a background
+    thread, with a random initial delay so worker processes do not sweep in
+    lockstep. An ``interval`` of 0 disables the periodic sweep; failures are
+    still learned from sends. ``get_store()`` returns the current chat store,
+    which may change after startup (MongoDB connects in the background).
+    """
+
+    def __init__(self, get_store, check, dispatcher, interval: float = 21600.0, dead_after: int = 3):
+        self.get_store = get_store
+        self.check = check
+        self.dispatcher = dispatcher
+        self.interval = interval
+        self.dead_after = max(1, int(dead_after))
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._thread = None
+        self.last_sweep = None
+
+    def configure(self, *, interval=None, dead_after=None) -> None:
+        if interval is not None:
+            self.interval = interval
+        if dead_after is not None:
+            self.dead_after = max(1, int(dead_after))
+
+    def observe_send(self, env, group_id, status_code) -> None:
+        if status_code not in DEAD_STATUS_CODES:
+            if status_code is not None and 200 <= status_code < 300:
+                with self._lock:
+                    self._failures.pop(group_id, None)
+            return
+        with self._lock:
+            count = self._failures.get(group_id, 0) + 1
+            if count < self.dead_after:
+                self._failures[group_id] = count
+                return
+            self._failures.pop(group_id, None)
+        reason = f'send returned {status_code} {count} times in a row'
+        try:
+            if self.get_store().set_chats_active(env, [group_id], False, reason):
+                logger.warning("Marked chat %s inactive: %s", group_id, reason)
+        except Exception:
+            logger.exception("Failed to mark chat %s inactive", group_id)
+
+    def sweep(self, env) -> dict:
+        """Check every chat for ``env`` now. Returns counts of what was found and changed."""
+        if not self._sweep_lock.acquire(blocking=False):
+            return {'skipped': 'a sweep is already running'}
+        try:
+            started = time.monotonic()
+            store = self.get_store()
+            chats = store.list_chats(env)
+            active = {chat['groupme_id']: chat.get('active', True) for chat in chats}
+            dead, alive, unknown = [], [], 0
+            for group_id, ok in self.dispatcher.imap_unordered(self._safe_check, list(active)):
+                if ok is None:
+                    unknown += 1
+                elif ok:
+                    alive.append(group_id)
+                else:
+                    dead.append(group_id)
+
+            deactivated = store.set_chats_active(
+                env, [gid for gid in dead if active[gid]], False, 'GroupMe group lookup returned 403/404'
+            )
+            reactivated = store.set_chats_active(env, [gid for gid in alive if not active[gid]], True)
+            summary = {
+                'checked': len(active),
+                'alive': len(alive),
+                'dead': len(dead),
+                'unknown': unknown,
+                'deactivated': deactivated,
+                'reactivated': reactivated,
+                'seconds': round(time.monotonic() - started, 3),
+            }
+            self.last_sweep = {**summary, 'finished_at': time.time()}
+            logger.info("Chat health sweep for env=%s: %s", env, summary)
+            return summary
+        finally:
+            self._sweep_lock.release()
+
+    def _safe_check(self, group_id):
+        try:
+            return self.check(group_id)
+        except Exception:
+            logger.exception("Health check for group %s failed", group_id)
+            return None
+
+    def start(self, env) -> None:
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self._run, args=(env,), name='chat-health-sweeper', daemon=True)
+        self._thread.start()
+
+    def _run(self, env) -> None:
+        time.sleep(random.uniform(0, min(self.interval, 600)))
+        while self.interval > 0:
+            try:
+                self.sweep(env)
+            except Exception:
+                logger.exception("Chat health sweep failed")
+            time.sleep(self.interval)
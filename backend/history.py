@@ -0,0 +1,364 @@
+# history.py
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from pymongo import ASCENDING, DESCENDING, errors as pymongo_errors
+
+from mongo import insert_missing
+
+logger = logging.getLogger(__name__)
+
+DAY_SECONDS = 86400
+# Dimensions /api/messages/stats can group delivery outcomes by
+GROUP_BY_FIELDS = ('building', 'day', 'status_code')
+
+# Longest error text kept per failed delivery
+MAX_ERROR_LENGTH = 200
+
+
+def delivery_row(broadcast, building_id, entry) -> dict:
+    """The stored form of one group's outcome: flat, with the error only on failures."""
+    error = entry.get('error')
+    return {
+        'broadcast_id': broadcast['_id'],
+        'env': broadcast['env'],
+        'sent_at': broadcast['created_at'],
+        'building_id': building_id,
+        'group_id': entry['group_id'],
+        'floor_number': entry.get('floor_number'),
+        'success': bool(entry['success']),
+        'status_code': entry.get('status_code'),
+        'error': str(error)[:MAX_ERROR_LENGTH] if error and not entry['success'] else None,
+    }
+
+
+def _stats_row(key, total, sent) -> dict:
+    return {
+        'key': key,
+        'total': total,
+        'sent': sent,
+        'failed': total - sent,
+        'failure_rate': round((total - sent) / total, 4) if total else 0.0,
+    }
+
+
+class MemoryBroadcastHistory:
+    """Broadcast history kept in process memory, for development and tests.
+
+    At most ``max_broadcasts`` broadcasts (and their deliveries) are kept;
+    the oldest are dropped first.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_broadcasts: int = 500):
+        self.max_broadcasts = max_broadcasts
+        self._broadcasts = OrderedDict()
+        self._deliveries = {}
+        self._lock = threading.Lock()
+
+    def ensure_indexes(self) -> None:
+        pass
+
+    def record(self, broadcast, deliveries) -> None:
+        with self._lock:
+            self._broadcasts[broadcast['_id']] = dict(broadcast)
+            self._deliveries[broadcast['_id']] = list(deliveries)
+            while len(self._broadcasts) > self.max_broadcasts:
+                old_id, _ = self._broadcasts.popitem(last=False)
+                self._deliveries.pop(old_id, None)
+
+    def list_broadcasts(self, env, limit, before=None) -> list:
+        with self._lock:
+            broadcasts = [b for b in self._broadcasts.values() if b['env'] == env]
+        broadcasts.sort(key=lambda b: (b['created_at'], b['_id']), reverse=True)
+        if before is not None:
+            broadcasts = [b for b in broadcasts if (b['created_at'], b['_id']) < before]
+        return [dict(b) for b in broadcasts[:limit]]
+
+    def get_broadcast(self, env, broadcast_id):
+        with self._lock:
+            broadcast = self._broadcasts.get(broadcast_id)
+            if broadcast is None or broadcast['env'] != env:
+                return None
+            deliveries = self._deliveries.get(broadcast_id, [])
+        hidden = ('broadcast_id', 'env', 'sent_at')
+        return {**broadcast, 'deliveries': [{k: v for k, v in d.items() if k not in hidden} for d in deliveries]}
+
+    def all_broadcasts(self) -> list:
+        """Every stored ``(broadcast, deliveries)`` pair, oldest first."""
+        with self._lock:
+            return [(dict(b), list(self._deliveries.get(bid, []))) for bid, b in self._broadcasts.items()]
+
+    def stats(self, env, since, until, group_by, building_ids=None) -> list:
+        buildings = set(building_ids) if building_ids else None
+        totals = {}
+        with self._lock:
+            deliveries = [d for rows in self._deliveries.values() for d in rows]
+        for d in deliveries:
+            if d['env'] != env or not since <= d['sent_at'] < until:
+                continue
+            if buildings is not None and d['building_id'] not in buildings:
+                continue
+            if group_by == 'day':
+                key = int(d['sent_at'] // DAY_SECONDS) * DAY_SECONDS
+            elif group_by == 'status_code':
+                key = d['status_code']
+            else:
+                key = d['building_id']
+            counts = totals.setdefault(key, [0, 0])
+            counts[0] += 1
+            counts[1] += d['success']
+        # None first, as MongoDB and SQLite sort it
+        ordered = sorted(totals, key=lambda k: (k is not None, k if k is not None else 0))
+        return [_stats_row(key, *totals[key]) for key in ordered]
+
+
+class MongoBroadcastHistory:
+    """Broadcast history in the ``broadcasts`` and ``broadcast_deliveries`` collections.
+
+    Each broadcast is one document plus one small document per group, written
+    with a single unordered ``insert_many`` when the broadcast finishes.
+    ``stats`` is one aggregation pipeline whose ``$match`` is served by the
+    ``(env, sent_at, building_id)`` index.
+    """
+
+    name = 'mongo'
+
+    def __init__(self, db):
+        self.broadcasts = db['broadcasts']
+        self.deliveries = db['broadcast_deliveries']
+
+    def ensure_indexes(self) -> None:
+        """Create the indexes the history queries rely on (no-op if they already exist).
+
+        - ``broadcasts (env, created_at, _id)``: newest-first history pages
+        - ``broadcast_deliveries (env, sent_at, building_id)``: stats over a time range
+        - ``broadcast_deliveries (broadcast_id)``: one broadcast's deliveries
+        """
+        indexes = (
+            (self.broadcasts, [('env', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], 'env_created_at'),
+            (self.deliveries, [('env', ASCENDING), ('sent_at', ASCENDING), ('building_id', ASCENDING)],
+             'env_sent_at_building'),
+            (self.deliveries, [('broadcast_id', ASCENDING)], 'broadcast_id'),
+        )
+        for collection, keys, name in indexes:
+            try:
+                collection.create_index(keys, name=name)
+            except pymongo_errors.PyMongoError:
+                logger.exception("Failed to create index %s on %s", name, collection.name)
+
+    def record(self, broadcast, deliveries) -> None:
+        self.broadcasts.insert_one(dict(broadcast))
+        if deliveries:
+            # insert_many mutates its documents (adds _id); keep the caller's rows clean
+            self.deliveries.insert_many([dict(d) for d in deliveries], ordered=False)
+
+    def adopt(self, source) -> int:
+        """Copy the broadcasts recorded in the in-memory ``source`` into MongoDB; safe to repeat."""
+        records = source.all_broadcasts()
+        inserted = set(insert_missing(self.broadcasts, [broadcast for broadcast, _ in records]))
+        # Deliveries have no natural key, so only those of newly copied broadcasts are written
+        deliveries = [d for broadcast, rows in records if broadcast['_id'] in inserted for d in rows]
+        if deliveries:
+            self.deliveries.insert_many([dict(d) for d in deliveries], ordered=False)
+        return len(inserted)
+
+    def list_broadcasts(self, env, limit, before=None) -> list:
+        query = {'env': env}
+        if before is not None:
+            created_at, broadcast_id = before
+            query['$or'] = [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': broadcast_id}},
+            ]
+        cursor = self.broadcasts.find(query).sort([('created_at', DESCENDING), ('_id', DESCENDING)]).limit(limit)
+        return list(cursor)
+
+    def get_broadcast(self, env, broadcast_id):
+        broadcast = self.broadcasts.find_one({'_id': broadcast_id, 'env': env})
+        if broadcast is None:
+            return None
+        projection = {'_id': 0, 'broadcast_id': 0, 'env': 0, 'sent_at': 0}
+        broadcast['deliveries'] = list(self.deliveries.find({'broadcast_id': broadcast_id}, projection))
+        return broadcast
+
+    def stats(self, env, since, until, group_by, building_ids=None) -> list:
+        match = {'env': env, 'sent_at': {'$gte': since, '$lt': until}}
+        if building_ids:
+            match['building_id'] = {'$in': list(building_ids)}
+        if group_by == 'day':
+            key = {'$subtract': ['$sent_at', {'$mod': ['$sent_at', DAY_SECONDS]}]}
+        elif group_by == 'status_code':
+            key = '$status_code'
+        else:
+            key = '$building_id'
+        pipeline = [
+            {'$match': match},
+            {'$group': {'_id': key, 'total': {'$sum': 1}, 'sent': {'$sum': {'$cond': ['$success', 1, 0]}}}},
+            {'$sort': {'_id': 1}},
+        ]
+        return [_stats_row(row['_id'], row['total'], row['sent']) for row in self.deliveries.aggregate(pipeline)]
+
+
+class SQLiteBroadcastHistory:
+    """Broadcast history in SQLite, next to the chats of ``SQLiteChatStore``.
+
+    A broadcast and its deliveries are written in one transaction, the
+    deliveries with one ``executemany``. The stats query is covered by the
+    ``(env, sent_at, building_id, success, status_code)`` index.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id TEXT PRIMARY KEY,
+            env TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            finished_at REAL,
+            source TEXT,
+            job_id TEXT,
+            idempotency_key TEXT,
+            message_body TEXT,
+            image_url TEXT,
+            building_ids TEXT,
+            total INTEGER NOT NULL,
+            sent INTEGER NOT NULL,
+            failed INTEGER NOT NULL,
+            replayed INTEGER NOT NULL,
+            complete INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+            broadcast_id TEXT NOT NULL,
+            env TEXT NOT NULL,
+            sent_at REAL NOT NULL,
+            building_id,
+            group_id TEXT NOT NULL,
+            floor_number,
+            success INTEGER NOT NULL,
+            status_code INTEGER,
+            error TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS broadcasts_env_created ON broadcasts (env, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS deliveries_env_sent "
+        "ON broadcast_deliveries (env, sent_at, building_id, success, status_code)",
+        "CREATE INDEX IF NOT EXISTS deliveries_broadcast ON broadcast_deliveries (broadcast_id)",
+    )
+
+    BROADCAST_COLUMNS = ('id', 'env', 'created_at', 'finished_at', 'source', 'job_id', 'idempotency_key',
+                         'message_body', 'image_url', 'building_ids', 'total', 'sent', 'failed', 'replayed',
+                         'complete')
+    DELIVERY_COLUMNS = ('broadcast_id', 'env', 'sent_at', 'building_id', 'group_id', 'floor_number', 'success',
+                        'status_code', 'error')
+
+    def __init__(self, path: str = 'rhac.sqlite3'):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def ensure_indexes(self) -> None:
+        pass  # created with the tables
+
+    def _row_to_broadcast(self, row) -> dict:
+        broadcast = dict(zip(self.BROADCAST_COLUMNS, row))
+        broadcast['_id'] = broadcast.pop('id')
+        broadcast['building_ids'] = json.loads(broadcast['building_ids'] or '[]')
+        broadcast['complete'] = bool(broadcast['complete'])
+        return broadcast
+
+    def record(self, broadcast, deliveries) -> None:
+        values = {**broadcast, 'id': broadcast['_id'], 'building_ids': json.dumps(broadcast.get('building_ids') or [])}
+        conn = self._conn()
+        with self._write_lock, conn:
+            conn.execute(
+                f"INSERT INTO broadcasts ({', '.join(self.BROADCAST_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.BROADCAST_COLUMNS))})",
+                [values.get(column) for column in self.BROADCAST_COLUMNS],
+            )
+            conn.executemany(
+                f"INSERT INTO broadcast_deliveries ({', '.join(self.DELIVERY_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(self.DELIVERY_COLUMNS))})",
+                [[d.get(column) for column in self.DELIVERY_COLUMNS] for d in deliveries],
+            )
+
+    def list_broadcasts(self, env, limit, before=None) -> list:
+        query = f"SELECT {', '.join(self.BROADCAST_COLUMNS)} FROM broadcasts WHERE env = ?"
+        params = [env]
+        if before is not None:
+            query += ' AND (created_at < ? OR (created_at = ? AND id < ?))'
+            params += [before[0], before[0], before[1]]
+        query += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+        params.append(limit)
+        return [self._row_to_broadcast(row) for row in self._conn().execute(query, params)]
+
+    def get_broadcast(self, env, broadcast_id):
+        conn = self._conn()
+        row = conn.execute(
+            f"SELECT {', '.join(self.BROADCAST_COLUMNS)} FROM broadcasts WHERE id = ? AND env = ?",
+            (broadcast_id, env),
+        ).fetchone()
+        if row is None:
+            return None
+        broadcast = self._row_to_broadcast(row)
+        rows = conn.execute(
+            'SELECT building_id, group_id, floor_number, success, status_code, error '
+            'FROM broadcast_deliveries WHERE broadcast_id = ? ORDER BY rowid',
+            (broadcast_id,),
+        )
+        broadcast['deliveries'] = [
+            {'building_id': building_id, 'group_id': group_id, 'floor_number': floor_number,
+             'success': bool(success), 'status_code': status_code, 'error': error}
+            for building_id, group_id, floor_number, success, status_code, error in rows
+        ]
+        return broadcast
+
+    def stats(self, env, since, until, group_by, building_ids=None) -> list:
+        if group_by == 'day':
+            key = f'CAST(sent_at / {DAY_SECONDS} AS INTEGER) * {DAY_SECONDS}'
+        elif group_by == 'status_code':
+            key = 'status_code'
+        else:
+            key = 'building_id'
+        query = (f'SELECT {key} AS k, COUNT(*), SUM(success) FROM broadcast_deliveries '
+                 'WHERE env = ? AND sent_at >= ? AND sent_at < ?')
+        params = [env, since, until]
+        if building_ids:
+            query += f" AND building_id IN ({','.join('?' * len(building_ids))})"
+            params += list(building_ids)
+        query += ' GROUP BY k ORDER BY k'
+        return [_stats_row(key, total, sent) for key, total, sent in self._conn().execute(query, params)]
+
+
+def create_history_store(backend, *, db=None, sqlite_path='rhac.sqlite3'):
+    """Build the broadcast history store for ``backend`` ('mongo', 'sqlite' or 'memory')."""
+    backend = (backend or 'memory').lower()
+    if backend == 'mongo':
+        if db is None:
+            raise ValueError("The mongo history backend needs a database handle")
+        return MongoBroadcastHistory(db)
+    if backend == 'sqlite':
+        return SQLiteBroadcastHistory(sqlite_path)
+    if backend == 'memory':
+        return MemoryBroadcastHistory()
+    raise ValueError(f"Unknown storage backend: {backend}")
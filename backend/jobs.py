@@ -0,0 +1,532 @@
+# jobs.py
+import heapq
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pymongo import ASCENDING, ReturnDocument, errors as pymongo_errors
+
+from mongo import insert_missing
+
+logger = logging.getLogger(__name__)
+
+JOB_SCHEDULED = 'scheduled'
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+
+def _now() -> float:
+    return time.time()
+
+
+def _stale_running(cutoff) -> dict:
+    """Query for running jobs with no heartbeat since ``cutoff``."""
+    # Jobs claimed before heartbeats existed only have started_at
+    return {'status': JOB_RUNNING, '$or': [
+        {'heartbeat_at': {'$lt': cutoff}},
+        {'heartbeat_at': None, 'started_at': {'$lt': cutoff}},
+    ]}
+
+
+class BroadcastJobStore:
+    """Persist broadcast jobs in MongoDB, or in memory when no collection is given.
+
+    Job documents use the job id as ``_id`` and look like::
+
+        {
+          '_id': str, 'env': str,
+          'status': 'scheduled'|'queued'|'running'|'completed'|'failed'|'cancelled',
+          'created_at': float, 'started_at': float|None, 'finished_at': float|None,
+          'heartbeat_at': float|None,  # refreshed by the worker while the job is running
+          'run_at': float|None,      # epoch seconds for scheduled broadcasts
+          'request': {...},          # what to send
+          'progress': {'total': int, 'completed': int, 'sent': int, 'failed': int},
+          'result': {...}|None,      # final response body, same shape as /api/messages/send
+          'status_code': int|None,   # status the synchronous endpoint would have returned
+        }
+
+    The in-memory store keeps at most ``max_memory_jobs`` jobs, evicting the
+    oldest that are not still scheduled.
+
+    ``fallback`` is the in-memory store used before MongoDB connected. Its
+    pending jobs are moved over with ``adopt_pending``; jobs that were already
+    running or finished stay there and ``get`` still finds them.
+    """
+
+    def __init__(self, collection=None, max_memory_jobs: int = 500, fallback=None):
+        self.collection = collection
+        self.max_memory_jobs = max_memory_jobs
+        self.fallback = fallback
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ensure_indexes(self) -> None:
+        """Index the pending-job lookups (``queued_ids`` and ``scheduled``)."""
+        if self.collection is None:
+            return
+        try:
+            self.collection.create_index(
+                [('env', ASCENDING), ('status', ASCENDING), ('run_at', ASCENDING)], name='env_status_run_at'
+            )
+        except pymongo_errors.PyMongoError:
+            logger.exception("Failed to create (env, status, run_at) index on broadcast_jobs")
+
+    def create(self, env, request_data, total, run_at=None) -> dict:
+        """Store a new job: ``queued``, or ``scheduled`` for ``run_at`` when one is given."""
+        job = {
+            '_id': uuid.uuid4().hex,
+            'env': env,
+            'status': JOB_SCHEDULED if run_at is not None else JOB_QUEUED,
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'run_at': run_at,
+            'request': request_data,
+            'progress': {'total': total, 'completed': 0, 'sent': 0, 'failed': 0},
+            'result': None,
+            'status_code': None,
+        }
+        if self.collection is not None:
+            self.collection.insert_one(job)
+        else:
+            with self._lock:
+                self._jobs[job['_id']] = job
+                while len(self._jobs) > self.max_memory_jobs:
+                    # Oldest first, but never a broadcast that has yet to run
+                    victim = next((jid for jid, j in self._jobs.items() if j['status'] != JOB_SCHEDULED), None)
+                    if victim is None:
+                        break
+                    del self._jobs[victim]
+        return dict(job)
+
+    def get(self, job_id, env=None):
+        query = {'_id': job_id}
+        if env is not None:
+            query['env'] = env
+        if self.collection is not None:
+            job = self.collection.find_one(query)
+            if job is None and self.fallback is not None:
+                return self.fallback.get(job_id, env)
+            return job
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or (env is not None and job.get('env') != env):
+                return None
+            return {**job, 'progress': dict(job['progress'])}
+
+    def pending_jobs(self) -> list:
+        """Copies of the in-memory jobs that have yet to run (scheduled or queued)."""
+        with self._lock:
+            return [{**j, 'progress': dict(j['progress'])} for j in self._jobs.values()
+                    if j['status'] in (JOB_SCHEDULED, JOB_QUEUED)]
+
+    def release(self, jobs) -> list:
+        """Drop each of ``jobs`` from memory if its status has not changed since it was copied.
+
+        Returns the ids of jobs that moved on in the meantime (claimed,
+        promoted or cancelled) and were kept.
+        """
+        kept = []
+        with self._lock:
+            for copy in jobs:
+                job = self._jobs.get(copy['_id'])
+                if job is not None and job['status'] == copy['status']:
+                    del self._jobs[copy['_id']]
+                else:
+                    kept.append(copy['_id'])
+        return kept
+
+    def adopt_pending(self, source) -> int:
+        """Move scheduled and queued jobs from the in-memory ``source`` into this store.
+
+        Jobs are copied first and only then removed from ``source``. A job that
+        was claimed, promoted or cancelled in between stays in ``source`` and its
+        copy is deleted again, so no job ends up runnable in both stores. Safe
+        to call more than once.
+        """
+        jobs = source.pending_jobs()
+        if not jobs:
+            return 0
+        insert_missing(self.collection, jobs)
+        kept = source.release(jobs)
+        if kept:
+            self.collection.delete_many({'_id': {'$in': kept}, 'status': {'$in': [JOB_SCHEDULED, JOB_QUEUED]}})
+        return len(jobs) - len(kept)
+
+    def claim(self, job_id):
+        """Atomically move a queued job to running. Returns the job, or None if
+        it was already claimed (e.g. by another worker process)."""
+        if self.collection is not None:
+            return self.collection.find_one_and_update(
+                {'_id': job_id, 'status': JOB_QUEUED},
+                {'$set': {'status': JOB_RUNNING, 'started_at': _now(), 'heartbeat_at': _now()}},
+                return_document=ReturnDocument.AFTER,
+            )
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != JOB_QUEUED:
+                return None
+            job['status'] = JOB_RUNNING
+            job['started_at'] = job['heartbeat_at'] = _now()
+            return dict(job)
+
+    def _transition(self, job_id, from_status, fields, env=None):
+        """Atomically apply ``fields`` if the job is still in ``from_status``; return it or None."""
+        query = {'_id': job_id, 'status': from_status}
+        if env is not None:
+            query['env'] = env
+        if self.collection is not None:
+            return self.collection.find_one_and_update(query, {'$set': fields}, return_document=ReturnDocument.AFTER)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != from_status or (env is not None and job.get('env') != env):
+                return None
+            job.update(fields)
+            return {**job, 'progress': dict(job['progress'])}
+
+    def promote(self, job_id) -> bool:
+        """Move a due scheduled job to queued. False if it was cancelled or already promoted."""
+        return self._transition(job_id, JOB_SCHEDULED, {'status': JOB_QUEUED}) is not None
+
+    def cancel(self, job_id, env=None):
+        """Cancel a scheduled job. Returns the cancelled job, or None if it is not scheduled."""
+        return self._transition(job_id, JOB_SCHEDULED, {'status': JOB_CANCELLED, 'finished_at': _now()}, env)
+
+    def scheduled(self, env) -> list:
+        """Scheduled jobs for ``env``, earliest ``run_at`` first."""
+        if self.collection is not None:
+            return list(self.collection.find({'env': env, 'status': JOB_SCHEDULED}).sort('run_at', ASCENDING))
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values() if j.get('env') == env and j['status'] == JOB_SCHEDULED]
+        return sorted(jobs, key=lambda j: j['run_at'])
+
+    def update_progress(self, job_id, progress) -> None:
+        if self.collection is not None:
+            self.collection.update_one({'_id': job_id}, {'$set': {'progress': dict(progress), 'heartbeat_at': _now()}})
+            return
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job['progress'] = dict(progress)
+                job['heartbeat_at'] = _now()
+
+    def heartbeat(self, job_id) -> None:
+        """Mark a running job as still owned by a live worker."""
+        if self.collection is not None:
+            self.collection.update_one({'_id': job_id, 'status': JOB_RUNNING}, {'$set': {'heartbeat_at': _now()}})
+            return
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job['status'] == JOB_RUNNING:
+                job['heartbeat_at'] = _now()
+
+    def finish(self, job_id, status, progress, result, status_code) -> None:
+        fields = {
+            'status': status,
+            'finished_at': _now(),
+            'progress': dict(progress),
+            'result': result,
+            'status_code': status_code,
+        }
+        if self.collection is not None:
+            self.collection.update_one({'_id': job_id}, {'$set': fields})
+            return
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def queued_ids(self, env):
+        if self.collection is not None:
+            return [j['_id'] for j in self.collection.find({'env': env, 'status': JOB_QUEUED}, {'_id': 1})]
+        with self._lock:
+            return [jid for jid, j in self._jobs.items() if j.get('env') == env and j['status'] == JOB_QUEUED]
+
+    def recover_stale(self, env, lease) -> tuple:
+        """Release running jobs whose worker has not sent a heartbeat for ``lease`` seconds.
+
+        A job sent with an idempotency key goes back to ``queued``: its send
+        ledger and key-derived source_guids keep groups that were already
+        reached from getting the message twice. Any other job is marked
+        ``failed``, since running it again could repeat messages. Returns
+        ``(requeued_ids, failed_ids)``.
+        """
+        cutoff = _now() - lease
+        if self.collection is not None:
+            query = {'env': env, **_stale_running(cutoff)}
+            candidates = list(self.collection.find(query, {'_id': 1, 'request.idempotency_key': 1, 'progress.total': 1}))
+        else:
+            with self._lock:
+                candidates = [
+                    {'_id': jid, 'request': dict(j.get('request') or {}), 'progress': dict(j['progress'])}
+                    for jid, j in self._jobs.items()
+                    if j.get('env') == env and j['status'] == JOB_RUNNING
+                    and (j.get('heartbeat_at') or j.get('started_at') or 0) < cutoff
+                ]
+
+        requeued, failed = [], []
+        for candidate in candidates:
+            if (candidate.get('request') or {}).get('idempotency_key'):
+                # The rerun counts every group again, replays included
+                total = (candidate.get('progress') or {}).get('total', 0)
+                fields = {
+                    'status': JOB_QUEUED,
+                    'started_at': None,
+                    'heartbeat_at': None,
+                    'progress': {'total': total, 'completed': 0, 'sent': 0, 'failed': 0},
+                }
+                bucket = requeued
+            else:
+                fields = {
+                    'status': JOB_FAILED,
+                    'finished_at': _now(),
+                    'result': {'error': 'Broadcast stopped when its worker exited; it was not retried'},
+                    'status_code': 500,
+                }
+                bucket = failed
+            if self._release_stale(candidate['_id'], cutoff, fields):
+                bucket.append(candidate['_id'])
+        return requeued, failed
+
+    def _release_stale(self, job_id, cutoff, fields) -> bool:
+        # Re-check staleness in the update so a job that just heartbeated, or
+        # that another worker already released, is left alone
+        if self.collection is not None:
+            query = {'_id': job_id, **_stale_running(cutoff)}
+            return self.collection.update_one(query, {'$set': fields}).modified_count == 1
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != JOB_RUNNING or (job.get('heartbeat_at') or job.get('started_at') or 0) >= cutoff:
+                return False
+            job.update(fields)
+            return True
+
+
+class BroadcastJobRunner:
+    """In-process worker pool that executes queued broadcast jobs.
+
+    ``execute(job, report)`` performs the delivery for one job. It calls
+    ``report(sent, failed)`` once per finished group and returns
+    ``(result_body, status_code)``. Progress is written back to the store at
+    most every ``progress_interval`` seconds so large jobs do not turn into one
+    database write per message.
+
+    While a job runs, its worker refreshes ``heartbeat_at`` every third of
+    ``lease`` seconds. ``resume_pending`` releases running jobs whose heartbeat
+    is older than ``lease``, since the worker that claimed them has gone.
+    """
+
+    def __init__(self, store, execute, workers: int = 2, progress_interval: float = 1.0, lease: float = 300.0):
+        self.store = store
+        self.execute = execute
+        self.workers = max(1, int(workers))
+        self.progress_interval = progress_interval
+        self.lease = lease
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='broadcast-job')
+        return self._executor
+
+    def configure(self, *, store=None, workers=None, lease=None) -> None:
+        """Swap the job store and/or resize the pool for jobs submitted afterwards."""
+        with self._lock:
+            if store is not None:
+                self.store = store
+            if lease is not None:
+                self.lease = lease
+            if workers is not None and max(1, int(workers)) != self.workers:
+                self.workers = max(1, int(workers))
+                old, self._executor = self._executor, None
+                if old is not None:
+                    old.shutdown(wait=False)
+
+    def submit(self, job_id) -> None:
+        self._get_executor().submit(self._run, job_id)
+
+    def _run(self, job_id) -> None:
+        # A job keeps the store it was claimed from, even if configure() swaps it mid-run
+        store = self.store
+        job = store.claim(job_id)
+        if job is None:
+            return
+
+        progress = dict(job['progress'])
+        progress_lock = threading.Lock()
+        last_flush = [0.0]
+
+        def report(sent, failed):
+            with progress_lock:
+                progress['completed'] += 1
+                progress['sent'] += sent
+                progress['failed'] += failed
+                now = _now()
+                if now - last_flush[0] < self.progress_interval:
+                    return
+                last_flush[0] = now
+                snapshot = dict(progress)
+            try:
+                store.update_progress(job_id, snapshot)
+            except Exception:
+                logger.exception("Failed to record progress for broadcast job %s", job_id)
+
+        done = threading.Event()
+
+        def heartbeat():
+            while not done.wait(self.lease / 3):
+                try:
+                    store.heartbeat(job_id)
+                except Exception:
+                    logger.exception("Failed to record heartbeat for broadcast job %s", job_id)
+
+        threading.Thread(target=heartbeat, name=f'broadcast-job-heartbeat-{job_id}', daemon=True).start()
+        try:
+            result, status_code = self.execute(job, report)
+            status = JOB_COMPLETED
+        except Exception as e:
+            logger.exception("Broadcast job %s failed", job_id)
+            result, status_code, status = {'error': str(e)}, 500, JOB_FAILED
+        finally:
+            done.set()
+
+        try:
+            store.finish(job_id, status, progress, result, status_code)
+        except Exception:
+            logger.exception("Failed to record result for broadcast job %s", job_id)
+        logger.info("Broadcast job %s %s: %s", job_id, status, progress)
+
+    def resume_pending(self, env) -> int:
+        """Queue jobs left in ``queued`` state, e.g. after a restart, after
+        releasing running jobs whose lease expired (see ``recover_stale``).
+        Claiming is atomic, so it is safe for several workers to call this."""
+        try:
+            requeued, failed = self.store.recover_stale(env, self.lease)
+        except Exception:
+            logger.exception("Failed to release stale broadcast jobs")
+        else:
+            if requeued or failed:
+                logger.warning("Released stale broadcast jobs: requeued %s, failed %s", requeued, failed)
+        try:
+            job_ids = self.store.queued_ids(env)
+        except Exception:
+            logger.exception("Failed to look up pending broadcast jobs")
+            return 0
+        for job_id in job_ids:
+            self.submit(job_id)
+        if job_ids:
+            logger.info("Resumed %d pending broadcast jobs", len(job_ids))
+        return len(job_ids)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+class BroadcastScheduler:
+    """Timer queue that hands scheduled broadcast jobs to the runner when they fall due.
+
+    Pending ``(run_at, job_id)`` pairs sit in a heap, and one thread sleeps
+    until the earliest ``run_at`` (or until ``add`` schedules an earlier one).
+    A due job is promoted from ``scheduled`` to ``queued`` atomically in the
+    store before it is submitted. With several worker processes sharing
+    MongoDB, only one of them runs it. Cancelled jobs stay in the heap and are
+    skipped when their promote fails.
+
+    The heap is rebuilt from the store at ``start()`` and re-synced every
+    ``refresh_interval`` seconds. That picks up broadcasts scheduled by other
+    processes. It is one query per interval, not one per job.
+    """
+
+    def __init__(self, store, runner, refresh_interval: float = 60.0):
+        self.store = store
+        self.runner = runner
+        self.refresh_interval = refresh_interval
+        self.env = None
+        self._heap = []
+        self._pending = set()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def configure(self, *, store=None, refresh_interval=None) -> None:
+        with self._cond:
+            if store is not None:
+                self.store = store
+            if refresh_interval is not None:
+                self.refresh_interval = refresh_interval
+            self._cond.notify()
+
+    def start(self, env) -> None:
+        self.env = env
+        self.refresh()
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='broadcast-scheduler', daemon=True)
+                self._thread.start()
+
+    def add(self, job_id, run_at) -> None:
+        # A NaN key would never compare as due and would stall every job behind it
+        if not isinstance(run_at, (int, float)) or not math.isfinite(run_at):
+            logger.error("Not scheduling broadcast job %s: invalid run_at %r", job_id, run_at)
+            return
+        with self._cond:
+            if job_id in self._pending:
+                return
+            self._pending.add(job_id)
+            heapq.heappush(self._heap, (run_at, job_id))
+            self._cond.notify()
+
+    def refresh(self) -> None:
+        """Load scheduled jobs from the store into the heap."""
+        try:
+            jobs = self.store.scheduled(self.env)
+        except Exception:
+            logger.exception("Failed to load scheduled broadcast jobs")
+            return
+        for job in jobs:
+            self.add(job['_id'], job['run_at'])
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
+
+    def _next_due(self):
+        """Block until a job is due and return its id, or None when it is time to refresh."""
+        refresh_at = _now() + self.refresh_interval
+        with self._cond:
+            while True:
+                now = _now()
+                if self._heap and self._heap[0][0] <= now:
+                    _, job_id = heapq.heappop(self._heap)
+                    self._pending.discard(job_id)
+                    return job_id
+                if now >= refresh_at:
+                    return None
+                wake_at = min(self._heap[0][0], refresh_at) if self._heap else refresh_at
+                self._cond.wait(wake_at - now)
+
+    def _run(self) -> None:
+        while True:
+            job_id = self._next_due()
+            if job_id is None:
+                self.refresh()
+                continue
+            try:
+                if self.store.promote(job_id):
+                    logger.info("Scheduled broadcast job %s is due", job_id)
+                    self.runner.submit(job_id)
+            except Exception:
+                logger.exception("Failed to start scheduled broadcast job %s", job_id)
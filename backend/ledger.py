@@ -0,0 +1,158 @@
+# ledger.py
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, ReturnDocument, errors as pymongo_errors
+
+from mongo import insert_missing
+
+logger = logging.getLogger(__name__)
+
+# Namespace for source_guids derived from an idempotency key and a group id
+SOURCE_GUID_NAMESPACE = uuid.UUID('5f1d3c1e-6b8a-4a7e-9a59-2c1b7d0e4f21')
+
+
+def _now() -> float:
+    return time.time()
+
+
+class SendLedger:
+    """Per-broadcast record of which groups a message was delivered to.
+
+    Broadcasts sent with an idempotency key get one ledger document, keyed by
+    ``<env>:<key>``::
+
+        {
+          '_id': str, 'env': str, 'key': str,
+          'fingerprint': str,        # hash of the request, to reject key reuse
+          'image_url': str|None,     # uploaded image, reused on retries
+          'job_id': str|None,        # set when the broadcast was queued as a job
+          'created_at': float,
+          'groups': {group_id: {'success', 'status_code', 'error', 'updated_at'}},
+        }
+
+    Documents live in MongoDB (expired by a TTL index after ``ttl`` seconds), or
+    in memory when no collection is given, where at most ``max_memory_broadcasts``
+    are kept.
+    """
+
+    def __init__(self, collection=None, ttl: float = 7 * 86400, max_memory_broadcasts: int = 500):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_memory_broadcasts = max_memory_broadcasts
+        self._records = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def source_guid(key, group_id) -> str:
+        """Stable GroupMe ``source_guid`` for one group of one broadcast.
+
+        Every attempt, including retried requests, sends the same guid, so
+        GroupMe drops the duplicate even if the ledger missed a delivery.
+        """
+        return str(uuid.uuid5(SOURCE_GUID_NAMESPACE, f'{key}:{group_id}'))
+
+    def ensure_indexes(self) -> None:
+        if self.collection is None:
+            return
+        try:
+            self.collection.create_index(
+                [('created_at_dt', ASCENDING)], expireAfterSeconds=int(self.ttl), name='created_at_ttl'
+            )
+        except pymongo_errors.PyMongoError:
+            logger.exception("Failed to create TTL index on send_ledger")
+
+    def adopt(self, source) -> int:
+        """Copy the unexpired records of the in-memory ledger ``source`` into this one.
+
+        Records already stored here are left alone, so this is safe to repeat.
+        """
+        with source._lock:
+            records = [{**r, 'groups': dict(r['groups'])} for r in source._records.values() if not source._expired(r)]
+        for record in records:
+            record['created_at_dt'] = datetime.fromtimestamp(record['created_at'], timezone.utc)
+        return len(insert_missing(self.collection, records))
+
+    def _expired(self, record) -> bool:
+        return bool(self.ttl) and _now() - record['created_at'] > self.ttl
+
+    def begin(self, env, key, fingerprint) -> dict:
+        """Return the ledger record for ``key``, creating it if this is the first attempt."""
+        record_id = f'{env}:{key}'
+        created_at = _now()
+        fields = {
+            'env': env,
+            'key': key,
+            'fingerprint': fingerprint,
+            'image_url': None,
+            'job_id': None,
+            'created_at': created_at,
+            'groups': {},
+        }
+        if self.collection is not None:
+            # TTL indexes only expire BSON dates, so keep a datetime copy of created_at
+            fields['created_at_dt'] = datetime.fromtimestamp(created_at, timezone.utc)
+            try:
+                return self.collection.find_one_and_update(
+                    {'_id': record_id},
+                    {'$setOnInsert': fields},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                )
+            except pymongo_errors.DuplicateKeyError:
+                # Two first attempts raced on the upsert; the other one created it
+                return self.collection.find_one({'_id': record_id})
+        with self._lock:
+            record = self._records.get(record_id)
+            if record is None or self._expired(record):
+                record = self._records[record_id] = {'_id': record_id, **fields}
+                while len(self._records) > self.max_memory_broadcasts:
+                    self._records.popitem(last=False)
+            return {**record, 'groups': dict(record['groups'])}
+
+    def update(self, env, key, **fields) -> None:
+        """Set top-level fields such as ``image_url`` or ``job_id``."""
+        record_id = f'{env}:{key}'
+        if self.collection is not None:
+            self.collection.update_one({'_id': record_id}, {'$set': fields})
+            return
+        with self._lock:
+            record = self._records.get(record_id)
+            if record is not None:
+                record.update(fields)
+
+    def record(self, env, key, group_id, result) -> None:
+        """Store the outcome of sending to ``group_id``. A confirmed delivery is never overwritten."""
+        entry = {
+            'success': bool(result.get('success')),
+            'status_code': result.get('status_code'),
+            'error': result.get('error'),
+            'updated_at': _now(),
+        }
+        record_id = f'{env}:{key}'
+        if self.collection is not None:
+            self.collection.update_one(
+                {'_id': record_id, f'groups.{group_id}.success': {'$ne': True}},
+                {'$set': {f'groups.{group_id}': entry}},
+            )
+            return
+        with self._lock:
+            record = self._records.get(record_id)
+            if record is not None and not record['groups'].get(str(group_id), {}).get('success'):
+                record['groups'][str(group_id)] = entry
+
+    def delivered(self, env, key) -> dict:
+        """Return ``{group_id: entry}`` for groups already confirmed as sent."""
+        record_id = f'{env}:{key}'
+        if self.collection is not None:
+            record = self.collection.find_one({'_id': record_id}, {'groups': 1})
+        else:
+            with self._lock:
+                record = self._records.get(record_id)
+                record = {'groups': dict(record['groups'])} if record is not None else None
+        groups = (record or {}).get('groups') or {}
+        return {gid: entry for gid, entry in groups.items() if entry.get('success')}
@@ -0,0 +1,201 @@
+"""Offline load test for /api/messages/send against a local fake GroupMe.
+
+Starts fake_groupme.FakeGroupMe, points GROUPME_API_URL at it, seeds
+``buildings x floors`` chats through ``add_chat`` and drives broadcasts through
+the Flask app. It reports message throughput, broadcast latency percentiles and
+process memory. Save a run with ``--json`` and compare later runs against it
+with ``--baseline``:
+
+    python loadtest.py --buildings 40 --floors 10 --broadcasts 20 --json baseline.json
+    python loadtest.py --buildings 40 --floors 10 --broadcasts 20 --baseline baseline.json
+
+Nothing is sent to the real GroupMe API.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_groupme import FakeGroupMe
+
+PASSWORD = 'loadtest'
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _rss_mb():
+    """Current resident set size in MiB (Linux), or None when unavailable."""
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run(args):
+    fake = FakeGroupMe(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                       rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, seed=args.seed).start()
+
+    # Configure the backend before it is imported: Config reads the environment at import time
+    os.environ.update({
+        'GROUPME_API_URL': fake.api_url,
+        'GROUPME_IMAGE_URL': fake.base_url,
+        'GROUPME_ACCESS_TOKEN': 'loadtest-token',
+        'EXECUTIVE_PASSWORD': PASSWORD,
+        'MONGODB_URI': os.environ.get('MONGODB_URI', '') if args.storage == 'mongo' else '',
+        'STORAGE_BACKEND': args.storage,
+        'SQLITE_PATH': args.sqlite_path,
+        'ENV': 'loadtest',
+        'SEND_MAX_IN_FLIGHT': str(args.max_in_flight),
+        'GROUPME_POOL_MAXSIZE': str(max(args.max_in_flight, 1)),
+        'GROUPME_RATE_LIMIT': str(args.rate_limit),
+        'GROUPME_GROUP_RATE_LIMIT': str(args.group_rate_limit),
+        'GROUPME_BACKOFF_BASE': '0.05',
+    })
+    logging.disable(logging.WARNING if args.quiet else logging.NOTSET)
+    import app as backend
+
+    backend.init_app()
+
+    building_ids = list(range(args.buildings))
+    seed_start = time.perf_counter()
+    for bid in building_ids:
+        for floor in range(args.floors):
+            backend.add_chat(f'lt-{bid}-{floor}', bid, floor)
+    seed_seconds = time.perf_counter() - seed_start
+    groups = args.buildings * args.floors
+
+    client = backend.app.test_client()
+    form = {'password': PASSWORD, 'message_body': 'load test', 'building_ids': [str(b) for b in building_ids]}
+
+    def broadcast(_):
+        start = time.perf_counter()
+        response = client.post('/api/messages/send', data=form)
+        return time.perf_counter() - start, response.status_code
+
+    rss_before = _rss_mb()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(broadcast, range(args.broadcasts)))
+    wall = time.perf_counter() - wall_start
+    rss_after = _rss_mb()
+
+    latencies = [latency for latency, _ in outcomes]
+    statuses = {}
+    for _, status in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    messages = groups * args.broadcasts
+
+    result = {
+        'config': {
+            'buildings': args.buildings, 'floors': args.floors, 'broadcasts': args.broadcasts,
+            'concurrency': args.concurrency, 'storage': args.storage, 'max_in_flight': args.max_in_flight,
+            'latency': args.latency, 'jitter': args.jitter, 'error_rate': args.error_rate,
+            'rate_limit_rate': args.rate_limit_rate,
+        },
+        'seed_seconds': round(seed_seconds, 4),
+        'wall_seconds': round(wall, 4),
+        'messages': messages,
+        'throughput_msgs_per_s': round(messages / wall, 2) if wall else None,
+        'broadcast_latency_s': {
+            'p50': round(_percentile(latencies, 50), 4),
+            'p95': round(_percentile(latencies, 95), 4),
+            'p99': round(_percentile(latencies, 99), 4),
+            'mean': round(statistics.fmean(latencies), 4) if latencies else None,
+        },
+        'statuses': statuses,
+        'memory_mb': {
+            'rss_before': round(rss_before, 1) if rss_before is not None else None,
+            'rss_after': round(rss_after, 1) if rss_after is not None else None,
+            'peak_rss': round(_peak_rss_mb(), 1),
+        },
+        'fake_groupme': dict(fake.counts),
+        'duplicate_messages': fake.duplicate_messages,
+        'groupme_client': backend.groupme_client.stats(),
+    }
+    fake.stop()
+    return result
+
+
+def _print_report(result, baseline=None):
+    def compare(value, base, lower_is_better=True):
+        if base in (None, 0) or value is None:
+            return ''
+        change = (value - base) / base * 100
+        better = change < 0 if lower_is_better else change > 0
+        return f"  ({change:+.1f}% vs baseline, {'better' if better else 'worse'})"
+
+    base = baseline or {}
+    base_lat = base.get('broadcast_latency_s', {})
+    lat = result['broadcast_latency_s']
+    cfg = result['config']
+    print(f"{cfg['buildings']} buildings x {cfg['floors']} floors, {cfg['broadcasts']} broadcasts "
+          f"({cfg['concurrency']} concurrent), storage={cfg['storage']}")
+    print(f"  throughput          {result['throughput_msgs_per_s']} msgs/s"
+          + compare(result['throughput_msgs_per_s'], base.get('throughput_msgs_per_s'), lower_is_better=False))
+    for pct in ('p50', 'p95', 'p99'):
+        print(f"  broadcast {pct}       {lat[pct]:.4f} s" + compare(lat[pct], base_lat.get(pct)))
+    mem = result['memory_mb']
+    print(f"  memory              rss {mem['rss_before']} -> {mem['rss_after']} MiB, peak {mem['peak_rss']} MiB"
+          + compare(mem['peak_rss'], base.get('memory_mb', {}).get('peak_rss')))
+    print(f"  statuses            {result['statuses']}")
+    print(f"  fake GroupMe        {result['fake_groupme']}, duplicates={result['duplicate_messages']}")
+    print(f"  GroupMe client      {result['groupme_client']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buildings', type=int, default=40)
+    parser.add_argument('--floors', type=int, default=10)
+    parser.add_argument('--broadcasts', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=1, help='broadcasts in flight at once')
+    parser.add_argument('--storage', choices=('memory', 'sqlite', 'mongo'), default='memory')
+    parser.add_argument('--sqlite-path', default='loadtest.sqlite3')
+    parser.add_argument('--max-in-flight', type=int, default=16, help='SEND_MAX_IN_FLIGHT for the backend')
+    parser.add_argument('--rate-limit', type=float, default=0, help='GROUPME_RATE_LIMIT (0 disables)')
+    parser.add_argument('--group-rate-limit', type=float, default=0, help='GROUPME_GROUP_RATE_LIMIT (0 disables)')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='fraction of calls answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare against results saved with --json')
+    parser.add_argument('--quiet', action='store_true', help='hide backend INFO logs')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    result = run(args)
+    _print_report(result, baseline)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
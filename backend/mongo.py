@@ -0,0 +1,151 @@
+# mongo.py
+import logging
+import threading
+import time
+
+from pymongo import MongoClient, errors as pymongo_errors
+
+from ratelimit import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+# MongoDB's duplicate key error code
+DUPLICATE_KEY = 11000
+
+STATE_DISABLED = 'disabled'
+STATE_CONNECTING = 'connecting'
+STATE_CONNECTED = 'connected'
+STATE_UNAVAILABLE = 'unavailable'
+
+
+class MongoConnector:
+    """Connects to MongoDB on a background thread so workers never block on it at startup.
+
+    ``start()`` returns at once. The thread pings the server, retrying with
+    jittered exponential backoff until it answers. It then calls
+    ``on_connect(db)`` once, so the app can switch from its in-memory fallback
+    to the MongoDB stores. After that it pings every ``health_interval``
+    seconds to keep ``status()`` current; pymongo reconnects its pool on its
+    own, so an outage only changes the reported state.
+
+    If ``on_connect`` raises, the connection counts as failed and is retried.
+    """
+
+    def __init__(self, on_connect=None, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 health_interval: float = 15.0):
+        self.on_connect = on_connect
+        self.uri = None
+        self.dbname = None
+        self.client_options = {}
+        self.backoff = RetryPolicy(base_delay=backoff_base, max_delay=backoff_max)
+        self.health_interval = health_interval
+        self.client = None
+        self.db = None
+        self._state = STATE_DISABLED
+        self._last_error = None
+        self._last_check = None
+        self._connected_at = None
+        self._failures = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def configure(self, uri, dbname, *, client_options=None, backoff_base=None, backoff_max=None,
+                  health_interval=None) -> None:
+        """Set the connection target; call before ``start()``."""
+        self.uri = uri
+        self.dbname = dbname
+        self.client_options = dict(client_options or {})
+        if backoff_base is not None or backoff_max is not None:
+            self.backoff = RetryPolicy(
+                base_delay=self.backoff.base_delay if backoff_base is None else backoff_base,
+                max_delay=self.backoff.max_delay if backoff_max is None else backoff_max,
+            )
+        if health_interval is not None:
+            self.health_interval = health_interval
+
+    @property
+    def connected(self) -> bool:
+        return self._state == STATE_CONNECTED
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'state': self._state,
+                'database': self.dbname,
+                'connected_at': self._connected_at,
+                'last_check': self._last_check,
+                'last_error': self._last_error,
+                'consecutive_failures': self._failures,
+            }
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._state = STATE_CONNECTING
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='mongo-connector', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _check(self) -> None:
+        if self.client is None:
+            # connect=False: the pool is created lazily, on the first command
+            self.client = MongoClient(self.uri, connect=False, **self.client_options)
+        self.client.admin.command('ping')
+        if self.db is None:
+            db = self.client[self.dbname]
+            if self.on_connect is not None:
+                self.on_connect(db)
+            self.db = db
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._check()
+            except Exception as e:
+                with self._lock:
+                    self._failures += 1
+                    failures = self._failures
+                    was_connected = self._state == STATE_CONNECTED
+                    self._state = STATE_UNAVAILABLE if self.db is not None else STATE_CONNECTING
+                    # Only the error type: /api/health is unauthenticated and messages include hostnames
+                    self._last_error = type(e).__name__
+                    self._last_check = time.time()
+                wait = self.backoff.delay(failures)
+                if was_connected or failures == 1:
+                    # Tracebacks only for failures in on_connect, not for plain connection errors
+                    logger.warning("MongoDB unavailable (%s); retrying in %.1fs", e, wait,
+                                   exc_info=not isinstance(e, pymongo_errors.PyMongoError))
+                else:
+                    logger.debug("MongoDB still unavailable after %d attempts: %s", failures, e)
+            else:
+                with self._lock:
+                    if self._state != STATE_CONNECTED:
+                        self._connected_at = time.time()
+                        logger.info("Connected to MongoDB: %s", self.dbname)
+                    self._state = STATE_CONNECTED
+                    self._failures = 0
+                    self._last_error = None
+                    self._last_check = time.time()
+                wait = self.health_interval
+            self._stop.wait(wait)
+
+
+def insert_missing(collection, documents) -> list:
+    """Insert ``documents``, skipping any whose ``_id`` is already stored. Returns the inserted ids."""
+    documents = [dict(doc) for doc in documents]
+    if not documents:
+        return []
+    try:
+        collection.insert_many(documents, ordered=False)
+    except pymongo_errors.BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != DUPLICATE_KEY for error in errors):
+            raise
+        skipped = {error['index'] for error in errors}
+        return [doc['_id'] for i, doc in enumerate(documents) if i not in skipped]
+    return [doc['_id'] for doc in documents]
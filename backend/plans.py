@@ -0,0 +1,102 @@
+# plans.py
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING, errors as pymongo_errors
+
+from mongo import insert_missing
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> float:
+    return time.time()
+
+
+def group_map_to_rows(group_map) -> list:
+    """``{building_id: [entries]}`` -> ``[{'building_id', 'groups'}]``; MongoDB keys must be strings."""
+    return [{'building_id': bid, 'groups': list(entries)} for bid, entries in group_map.items()]
+
+
+def group_map_from_rows(rows) -> dict:
+    return {row['building_id']: row['groups'] for row in rows}
+
+
+class BroadcastPlanStore:
+    """Resolved recipient sets from ``POST /api/messages/plan``, looked up by plan token.
+
+    Plan documents look like::
+
+        {
+          '_id': str,                # the plan token
+          'env': str,
+          'building_ids': [int],
+          'recipients': [{'building_id': int, 'groups': [{'group_id', 'floor_number'}]}],
+          'created_at': float, 'expires_at': float,
+        }
+
+    Plans are kept for ``ttl`` seconds. In MongoDB a TTL index removes them;
+    in memory at most ``max_memory_plans`` are kept.
+    """
+
+    def __init__(self, collection=None, ttl: float = 900.0, max_memory_plans: int = 500):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_memory_plans = max_memory_plans
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ensure_indexes(self) -> None:
+        if self.collection is None:
+            return
+        try:
+            # expireAfterSeconds=0: each document expires at its own expires_at_dt
+            self.collection.create_index([('expires_at_dt', ASCENDING)], expireAfterSeconds=0, name='expires_at_ttl')
+        except pymongo_errors.PyMongoError:
+            logger.exception("Failed to create TTL index on broadcast_plans")
+
+    def create(self, env, building_ids, group_map) -> dict:
+        created_at = _now()
+        plan = {
+            '_id': uuid.uuid4().hex,
+            'env': env,
+            'building_ids': list(building_ids),
+            'recipients': group_map_to_rows(group_map),
+            'created_at': created_at,
+            'expires_at': created_at + self.ttl,
+        }
+        if self.collection is not None:
+            # TTL indexes only expire BSON dates
+            self.collection.insert_one({**plan, 'expires_at_dt': datetime.fromtimestamp(plan['expires_at'], timezone.utc)})
+        else:
+            with self._lock:
+                self._plans[plan['_id']] = plan
+                while len(self._plans) > self.max_memory_plans:
+                    self._plans.popitem(last=False)
+        return plan
+
+    def adopt(self, source) -> int:
+        """Copy the unexpired plans of the in-memory store ``source`` into this one; safe to repeat."""
+        with source._lock:
+            plans = [dict(plan) for plan in source._plans.values() if plan['expires_at'] >= _now()]
+        for plan in plans:
+            plan['expires_at_dt'] = datetime.fromtimestamp(plan['expires_at'], timezone.utc)
+        return len(insert_missing(self.collection, plans))
+
+    def get(self, token, env):
+        """Return the plan for ``token``, or None if it is unknown or expired."""
+        if self.collection is not None:
+            plan = self.collection.find_one({'_id': token, 'env': env}, {'expires_at_dt': 0})
+        else:
+            with self._lock:
+                plan = self._plans.get(token)
+            if plan is not None and plan.get('env') != env:
+                plan = None
+        # The TTL monitor only runs once a minute, so check expiry here too
+        if plan is None or plan['expires_at'] < _now():
+            return None
+        return plan
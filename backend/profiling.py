@@ -0,0 +1,178 @@
+# profiling.py
+import contextvars
+import cProfile
+import io
+import itertools
+import logging
+import pstats
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+MODE_SPANS = 'spans'
+MODE_CPROFILE = 'cprofile'
+MODES = (MODE_SPANS, MODE_CPROFILE)
+
+# The profile of the request running in this context, or None
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def record_span(name, seconds, labels=None) -> None:
+    """Add a timed call to the active request profile; a no-op outside a profiled request."""
+    profile = _current.get()
+    if profile is not None:
+        profile.add_span(name, seconds, labels)
+
+
+class RequestProfile:
+    """Timing for one request: the spans of its storage and GroupMe calls, plus optional cProfile output."""
+
+    def __init__(self, profile_id, method, path, route, mode, max_spans):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.route = route
+        self.mode = mode
+        self.max_spans = max_spans
+        self.started_at = time.time()
+        self.spans = []
+        self.dropped_spans = 0
+        self.status = None
+        self.seconds = None
+        self.stats = None
+        self._started = time.perf_counter()
+        self._profiler = None
+        # Spans arrive from dispatcher threads during a broadcast
+        self._lock = threading.Lock()
+
+    def add_span(self, name, seconds, labels=None) -> None:
+        span = {
+            'name': name,
+            'labels': dict(labels or {}),
+            'offset': round(time.perf_counter() - self._started - seconds, 6),
+            'seconds': round(seconds, 6),
+            'thread': threading.current_thread().name,
+        }
+        with self._lock:
+            if len(self.spans) < self.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def summary(self) -> list:
+        """Span time grouped by name and labels, slowest first."""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            key = (span['name'], tuple(sorted(span['labels'].items())))
+            entry = totals.setdefault(key, {'name': span['name'], 'labels': span['labels'], 'count': 0, 'seconds': 0.0})
+            entry['count'] += 1
+            entry['seconds'] += span['seconds']
+        for entry in totals.values():
+            entry['seconds'] = round(entry['seconds'], 6)
+        return sorted(totals.values(), key=lambda entry: entry['seconds'], reverse=True)
+
+    def to_dict(self, detail=False) -> dict:
+        body = {
+            'id': self.id,
+            'method': self.method,
+            'path': self.path,
+            'route': self.route,
+            'mode': self.mode,
+            'status': self.status,
+            'started_at': self.started_at,
+            'seconds': self.seconds,
+            'span_count': len(self.spans) + self.dropped_spans,
+        }
+        if detail:
+            body['breakdown'] = self.summary()
+            body['spans'] = list(self.spans)
+            body['dropped_spans'] = self.dropped_spans
+            body['cprofile'] = self.stats
+        return body
+
+
+class RequestProfiler:
+    """Opt-in per-request profiling with results kept in a bounded ring buffer.
+
+    ``start(...)`` begins a profile for the current request and makes it the
+    active one, so every ``record_span`` call made while handling the request
+    (the ``metrics.timed`` helpers call it) lands in it, including calls made on
+    dispatcher threads. In ``cprofile`` mode the request thread also runs under
+    ``cProfile`` and the ``top`` functions by cumulative time are kept as text.
+
+    ``finish(profile, status)`` stops it and stores it; only the last
+    ``capacity`` profiles are kept, per worker process.
+    """
+
+    def __init__(self, capacity: int = 50, enabled: bool = False, mode: str = MODE_SPANS, top: int = 30,
+                 max_spans: int = 2000):
+        self.enabled = enabled
+        self.mode = mode if mode in MODES else MODE_SPANS
+        self.top = top
+        self.max_spans = max_spans
+        self._profiles = deque(maxlen=max(1, int(capacity)))
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def configure(self, *, capacity=None, enabled=None, mode=None, top=None) -> None:
+        with self._lock:
+            if capacity is not None:
+                self._profiles = deque(self._profiles, maxlen=max(1, int(capacity)))
+            if enabled is not None:
+                self.enabled = enabled
+            if mode is not None:
+                self.mode = mode if mode in MODES else MODE_SPANS
+            if top is not None:
+                self.top = top
+
+    def start(self, method, path, route, mode=None) -> RequestProfile:
+        mode = mode if mode in MODES else self.mode
+        profile = RequestProfile(f'{int(time.time())}-{next(self._ids)}', method, path, route, mode, self.max_spans)
+        if mode == MODE_CPROFILE:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler owns this thread (e.g. a debugger); keep the spans only
+                logger.warning("cProfile unavailable for %s %s; recording spans only", method, path)
+                profile.mode = MODE_SPANS
+            else:
+                profile._profiler = profiler
+        _current.set(profile)
+        return profile
+
+    def finish(self, profile, status) -> None:
+        _current.set(None)
+        profile.seconds = round(time.perf_counter() - profile._started, 6)
+        profile.status = status
+        if profile._profiler is not None:
+            profile._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profile._profiler, stream=out).sort_stats('cumulative').print_stats(self.top)
+            profile.stats = out.getvalue()
+            profile._profiler = None
+        with self._lock:
+            self._profiles.append(profile)
+
+    def recent(self) -> list:
+        """Stored profiles, newest first."""
+        with self._lock:
+            profiles = list(self._profiles)
+        return [profile.to_dict() for profile in reversed(profiles)]
+
+    def get(self, profile_id):
+        with self._lock:
+            for profile in self._profiles:
+                if profile.id == profile_id:
+                    return profile.to_dict(detail=True)
+        return None
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._profiles)
+            self._profiles.clear()
+        return count
@@ -0,0 +1,145 @@
+# ratelimit.py
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limited, or a transient server-side failure
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, holding at most ``capacity``.
+
+    A ``rate`` of 0 (or less) disables the bucket; every acquire succeeds at once.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity else max(1.0, self.rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available.
+
+        Returns 0 on success, otherwise the number of seconds until one will be.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> float:
+        """Block until a token is available. Returns the total time waited."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    """Global plus per-group token buckets for outbound GroupMe calls.
+
+    Per-group buckets are created on demand and the least recently used ones are
+    dropped once more than ``max_groups`` are tracked. ``pause(seconds)`` holds
+    back every caller, which is how a ``Retry-After`` from GroupMe is applied to
+    the whole process rather than only to the request that received it.
+    """
+
+    def __init__(self, rate: float = 0, burst: float | None = None,
+                 group_rate: float = 0, group_burst: float | None = None, max_groups: int = 10000):
+        self.global_bucket = TokenBucket(rate, burst)
+        self.group_rate = float(group_rate)
+        self.group_burst = group_burst
+        self.max_groups = max_groups
+        self._group_buckets = OrderedDict()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _group_bucket(self, group_id) -> TokenBucket:
+        with self._lock:
+            bucket = self._group_buckets.get(group_id)
+            if bucket is None:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+                self._group_buckets[group_id] = bucket
+                while len(self._group_buckets) > self.max_groups:
+                    self._group_buckets.popitem(last=False)
+            else:
+                self._group_buckets.move_to_end(group_id)
+            return bucket
+
+    def pause(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self, group_id=None) -> float:
+        """Block until the caller may send to ``group_id``. Returns time waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                pause = self._paused_until - time.monotonic()
+            if pause <= 0:
+                break
+            time.sleep(pause)
+            waited += pause
+        if group_id is not None and self.group_rate > 0:
+            waited += self._group_bucket(group_id).acquire()
+        waited += self.global_bucket.acquire()
+        return waited
+
+
+class RetryPolicy:
+    """Jittered exponential backoff ("full jitter") capped at ``max_delay``.
+
+    ``max_retries`` is the number of retries after the first attempt.
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Seconds to wait before retry number ``attempt`` (1-based).
+
+        A server-provided ``Retry-After`` takes precedence over the backoff.
+        """
+        if retry_after is not None:
+            return min(max(0.0, retry_after), self.max_delay)
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+def parse_retry_after(value) -> float | None:
+    """Parse a ``Retry-After`` header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
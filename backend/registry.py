@@ -0,0 +1,118 @@
+# registry.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Snapshot:
+    """Immutable view of one version of buildings.json plus its derived indexes."""
+
+    __slots__ = ('buildings', 'by_id', 'position', 'region_ids', 'all_ids', 'payload', 'etag')
+
+    def __init__(self, buildings):
+        self.buildings = buildings
+        self.by_id = {b['id']: b for b in buildings}
+        self.position = {b['id']: i for i, b in enumerate(buildings)}
+        region_ids = {}
+        for b in buildings:
+            region_ids.setdefault(b.get('region'), []).append(b['id'])
+        self.region_ids = {region: tuple(ids) for region, ids in region_ids.items()}
+        self.all_ids = tuple(b['id'] for b in buildings)
+        # Pre-serialized /api/buildings body and a strong ETag for it
+        self.payload = json.dumps({'buildings': buildings}, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha256(self.payload).hexdigest()[:32]
+
+
+class BuildingRegistry:
+    """Buildings loaded once from disk with precomputed lookups.
+
+    Readers get O(1) id and region lookups and a ready-to-send JSON payload.
+    ``maybe_reload()`` checks the file's mtime (at most every
+    ``reload_interval`` seconds) and swaps in a fresh snapshot when it changed,
+    so edits to buildings.json go live without a restart. A file that fails to
+    parse on reload is logged and the previous snapshot is kept.
+    """
+
+    def __init__(self, path: str = 'buildings.json', reload_interval: float = 5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._snapshot = _Snapshot([])
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """(Re)load the buildings file. Returns True if a new snapshot was installed."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, 'r', encoding='utf-8') as f:
+                buildings = json.load(f)
+        except FileNotFoundError:
+            if self._mtime is None:
+                logger.warning("%s not found; using empty buildings list", self.path)
+            return False
+        except json.JSONDecodeError as e:
+            logger.error("Failed to parse %s: %s", self.path, e)
+            return False
+
+        snapshot = _Snapshot(buildings)
+        with self._lock:
+            self._snapshot = snapshot
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+        logger.info("Loaded %d buildings from %s", len(buildings), self.path)
+        return True
+
+    def maybe_reload(self) -> bool:
+        """Reload if the file changed on disk since the last load."""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return False
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        return self.load()
+
+    @property
+    def buildings(self):
+        return self._snapshot.buildings
+
+    @property
+    def payload(self) -> bytes:
+        return self._snapshot.payload
+
+    @property
+    def etag(self) -> str:
+        return self._snapshot.etag
+
+    def get(self, building_id):
+        return self._snapshot.by_id.get(building_id)
+
+    def name(self, building_id) -> str:
+        building = self._snapshot.by_id.get(building_id)
+        return building.get('name', '') if building else ''
+
+    def ids_for_regions(self, regions):
+        """Return building ids for ``regions`` in file order; ``'all'`` selects every building."""
+        snapshot = self._snapshot
+        if 'all' in regions:
+            return list(snapshot.all_ids)
+        wanted = set(regions)
+        if len(wanted) == 1:
+            return list(snapshot.region_ids.get(next(iter(wanted)), ()))
+        # Keep file order when several regions are combined
+        ids = [bid for region in wanted for bid in snapshot.region_ids.get(region, ())]
+        ids.sort(key=snapshot.position.__getitem__)
+        return ids
+
+    def __len__(self):
+        return len(self._snapshot.buildings)
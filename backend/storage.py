@@ -0,0 +1,543 @@
+# storage.py
+import logging
+import sqlite3
+import threading
+
+from pymongo import ASCENDING, errors as pymongo_errors
+
+from cache import RecipientCache
+
+logger = logging.getLogger(__name__)
+
+# add_chats result for a chat that could not be written (a duplicate is None)
+INSERT_FAILED = False
+
+
+class DuplicateChatError(Exception):
+    """Raised when adding a chat whose (env, groupme_id) is already stored."""
+
+
+def _group_entry(groupme_id, floor_number):
+    return {'group_id': groupme_id, 'floor_number': floor_number}
+
+
+class ChatRecord:
+    """One stored chat. ``__slots__`` keeps per-chat overhead small for large rosters."""
+
+    __slots__ = ('groupme_id', 'building_id', 'floor_number', 'env', 'active', 'inactive_reason')
+
+    def __init__(self, groupme_id, building_id, floor_number, env, active=True, inactive_reason=None):
+        self.groupme_id = groupme_id
+        self.building_id = building_id
+        self.floor_number = floor_number
+        self.env = env
+        self.active = active
+        self.inactive_reason = inactive_reason
+
+    def as_dict(self) -> dict:
+        return {
+            'groupme_id': self.groupme_id,
+            'building_id': self.building_id,
+            'floor_number': self.floor_number,
+            'env': self.env,
+            'active': self.active,
+        }
+
+
+class MemoryChatStore:
+    """Thread-safe in-memory chat storage for development / offline mode.
+
+    Chats are indexed by ``(env, groupme_id)`` and ``(env, building_id)`` so the
+    duplicate check and recipient lookups are dict hits instead of list scans.
+    Contents are lost when the process exits.
+
+    Every store keeps an ``active`` flag per chat. Inactive chats (deleted
+    groups, or groups the bot was removed from) still count for the duplicate
+    check but are left out of recipient lookups.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._by_group = {}
+        self._by_building = {}
+        self._lock = threading.Lock()
+
+    def find_chat(self, env, groupme_id):
+        with self._lock:
+            record = self._by_group.get((env, groupme_id))
+            return record.as_dict() if record is not None else None
+
+    def _insert_locked(self, chat):
+        """Index ``chat`` and return its record, or None if it is a duplicate. Caller holds the lock."""
+        record = ChatRecord(chat['groupme_id'], chat['building_id'], chat['floor_number'], chat.get('env'),
+                            chat.get('active', True), chat.get('inactive_reason'))
+        key = (record.env, record.groupme_id)
+        if key in self._by_group:
+            return None
+        self._by_group[key] = record
+        self._by_building.setdefault((record.env, record.building_id), []).append(record)
+        return record
+
+    def existing_groupme_ids(self, env, groupme_ids) -> set:
+        with self._lock:
+            return {gid for gid in groupme_ids if (env, gid) in self._by_group}
+
+    def add_chat(self, chat) -> dict:
+        with self._lock:
+            record = self._insert_locked(chat)
+        if record is None:
+            raise DuplicateChatError(chat['groupme_id'])
+        return record.as_dict()
+
+    def add_chats(self, chats) -> list:
+        """Add several chats at once. Returns the stored chat, or None for a duplicate, per input."""
+        with self._lock:
+            records = [self._insert_locked(chat) for chat in chats]
+        return [record.as_dict() if record is not None else None for record in records]
+
+    def map_by_buildings(self, env, building_ids) -> dict:
+        with self._lock:
+            return {
+                bid: [
+                    _group_entry(r.groupme_id, r.floor_number)
+                    for r in self._by_building.get((env, bid), ()) if r.active
+                ]
+                for bid in building_ids
+            }
+
+    def groupme_ids_by_buildings(self, env, building_ids) -> list:
+        with self._lock:
+            return [r.groupme_id for bid in building_ids for r in self._by_building.get((env, bid), ()) if r.active]
+
+    def list_chats(self, env) -> list:
+        """Every chat for ``env``, active or not, with its ``inactive_reason``."""
+        with self._lock:
+            return [
+                {**r.as_dict(), 'inactive_reason': r.inactive_reason}
+                for (chat_env, _), r in self._by_group.items() if chat_env == env
+            ]
+
+    def set_chats_active(self, env, groupme_ids, active, reason=None) -> int:
+        """Mark chats active or inactive. Returns how many actually changed."""
+        changed = 0
+        with self._lock:
+            for gid in groupme_ids:
+                record = self._by_group.get((env, gid))
+                if record is not None and record.active != active:
+                    record.active = active
+                    record.inactive_reason = None if active else reason
+                    changed += 1
+        return changed
+
+    def all_chats(self) -> list:
+        """Every stored chat, in insertion order (e.g. to copy them to another backend)."""
+        with self._lock:
+            return [record.as_dict() for record in self._by_group.values()]
+
+    def __len__(self):
+        return len(self._by_group)
+
+
+# Chat lookups only ever need these fields. Both projections drop _id so the
+# queries can be answered from the indexes below without touching documents.
+CHAT_EXISTS_PROJECTION = {'_id': 0, 'groupme_id': 1}
+CHAT_LOOKUP_PROJECTION = {'_id': 0, 'groupme_id': 1, 'building_id': 1, 'floor_number': 1, 'active': 1}
+CHAT_LIST_PROJECTION = {**CHAT_LOOKUP_PROJECTION, 'env': 1, 'inactive_reason': 1}
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    if not isinstance(plan, dict):
+        return
+    if 'stage' in plan:
+        yield plan['stage']
+    for key in ('inputStage', 'queryPlan'):
+        yield from _plan_stages(plan.get(key))
+    for child in plan.get('inputStages', ()):
+        yield from _plan_stages(child)
+
+
+class MongoChatStore:
+    """Chat storage backed by the MongoDB ``chats`` collection.
+
+    Recipient lookups are served from a per-env ``RecipientCache`` of the whole
+    roster. ``add_chat`` invalidates it write-through and bumps a per-env
+    counter in ``chat_versions`` so other workers reload too.
+    """
+
+    name = 'mongo'
+
+    def __init__(self, db, cache_ttl: float = 300.0, version_check_interval: float = 5.0):
+        self.db = db
+        self.collection = db['chats']
+        self.versions = db['chat_versions']
+        self.recipients = RecipientCache(
+            self._load_roster,
+            ttl=cache_ttl,
+            get_version=self._roster_version,
+            version_check_interval=version_check_interval,
+        )
+
+    def ensure_indexes(self) -> None:
+        """Create the indexes the chat queries rely on (no-op if they already exist).
+
+        - ``(env, groupme_id)`` unique: duplicate check in ``add_floor_chat``
+        - ``(env, building_id, floor_number, groupme_id, active)``: broadcast
+          recipient lookups; ``groupme_id`` and ``active`` are trailing keys so
+          the lookup is covered. It replaces the older index without ``active``.
+
+        Chats stored before the ``active`` flag existed are backfilled with
+        ``active: true`` so the covered lookup never meets a missing field.
+        """
+        try:
+            self.collection.update_many({'active': {'$exists': False}}, {'$set': {'active': True}})
+        except pymongo_errors.PyMongoError:
+            logger.exception("Failed to backfill the active flag on chats")
+        try:
+            self.collection.create_index(
+                [('env', ASCENDING), ('groupme_id', ASCENDING)], unique=True, name='env_groupme_id_unique'
+            )
+        except pymongo_errors.PyMongoError:
+            # Usually pre-existing duplicate chats; the lookup still works without uniqueness
+            logger.exception("Failed to create unique (env, groupme_id) index on chats")
+        try:
+            self.collection.create_index(
+                [('env', ASCENDING), ('building_id', ASCENDING), ('floor_number', ASCENDING),
+                 ('groupme_id', ASCENDING), ('active', ASCENDING)],
+                name='env_building_floor_groupme_active',
+            )
+        except pymongo_errors.PyMongoError:
+            logger.exception("Failed to create (env, building_id, floor_number) index on chats")
+        else:
+            try:
+                self.collection.drop_index('env_building_floor_groupme')
+            except pymongo_errors.OperationFailure:
+                pass  # already gone
+
+    def check_query_plans(self, env) -> None:
+        """Log a warning if a chat lookup is not answered from an index alone.
+
+        A covered plan has an IXSCAN and no FETCH or COLLSCAN stage.
+        """
+        queries = {
+            'duplicate check': ({'groupme_id': '', 'env': env}, CHAT_EXISTS_PROJECTION),
+            'recipient lookup': ({'env': env}, CHAT_LOOKUP_PROJECTION),
+        }
+        for label, (query, projection) in queries.items():
+            try:
+                explained = self.collection.find(query, projection).explain()
+            except pymongo_errors.PyMongoError:
+                logger.exception("Could not explain chat %s query", label)
+                continue
+            stages = set(_plan_stages(explained.get('queryPlanner', {}).get('winningPlan')))
+            if 'IXSCAN' not in stages or stages & {'FETCH', 'COLLSCAN'}:
+                logger.warning("Chat %s query is not index-covered (plan stages: %s)", label, sorted(stages))
+            else:
+                logger.info("Chat %s query is index-covered", label)
+
+    def _load_roster(self, env) -> dict:
+        """Load every chat for ``env`` as building_id -> group entries."""
+        roster = {}
+        for chat in self.collection.find({'env': env}, CHAT_LOOKUP_PROJECTION):
+            if chat.get('active') is False:
+                continue
+            roster.setdefault(chat.get('building_id'), []).append(
+                _group_entry(chat.get('groupme_id'), chat.get('floor_number'))
+            )
+        return roster
+
+    def _roster_version(self, env):
+        """Return the shared roster version for ``env``; bumped by every worker that adds a chat."""
+        doc = self.versions.find_one({'_id': env}, {'version': 1})
+        return doc.get('version', 0) if doc else 0
+
+    def invalidate_recipients(self, env) -> None:
+        """Write-through invalidation after a roster change, here and in other workers."""
+        self.recipients.invalidate(env)
+        try:
+            self.versions.update_one({'_id': env}, {'$inc': {'version': 1}}, upsert=True)
+        except pymongo_errors.PyMongoError:
+            # Other workers will still pick the change up when their TTL expires
+            logger.exception("Failed to bump chat roster version for env=%s", env)
+
+    def find_chat(self, env, groupme_id):
+        return self.collection.find_one({'groupme_id': groupme_id, 'env': env}, CHAT_EXISTS_PROJECTION)
+
+    def existing_groupme_ids(self, env, groupme_ids) -> set:
+        """Return which of ``groupme_ids`` are already stored, in one ``$in`` query."""
+        groupme_ids = list(groupme_ids)
+        if not groupme_ids:
+            return set()
+        cursor = self.collection.find({'env': env, 'groupme_id': {'$in': groupme_ids}}, CHAT_EXISTS_PROJECTION)
+        return {doc['groupme_id'] for doc in cursor}
+
+    def add_chat(self, chat) -> dict:
+        chat = {'active': True, **chat}
+        try:
+            result = self.collection.insert_one(chat)
+        except pymongo_errors.DuplicateKeyError:
+            raise DuplicateChatError(chat['groupme_id'])
+        chat['_id'] = str(result.inserted_id)
+        self.invalidate_recipients(chat.get('env'))
+        return chat
+
+    def add_chats(self, chats) -> list:
+        """Insert several chats with one unordered ``insert_many``.
+
+        Returns the stored chat, None for a duplicate, or ``INSERT_FAILED`` for
+        any other write error, per input. The rest of the batch is still stored.
+        """
+        docs = [{'active': True, **chat} for chat in chats]
+        if not docs:
+            return []
+        duplicates, failed = set(), set()
+        try:
+            self.collection.insert_many(docs, ordered=False)
+        except pymongo_errors.BulkWriteError as e:
+            for error in e.details.get('writeErrors', ()):
+                if error.get('code') == 11000:
+                    duplicates.add(error['index'])
+                else:
+                    logger.error("Failed to insert chat %s: %s", docs[error['index']].get('groupme_id'), error.get('errmsg'))
+                    failed.add(error['index'])
+        finally:
+            # Part of the batch may be stored even when the write raised
+            for env in {doc.get('env') for doc in docs}:
+                self.invalidate_recipients(env)
+        results = []
+        for i, doc in enumerate(docs):
+            if i in duplicates:
+                results.append(None)
+            elif i in failed:
+                results.append(INSERT_FAILED)
+            else:
+                doc['_id'] = str(doc['_id'])
+                results.append(doc)
+        return results
+
+    def map_by_buildings(self, env, building_ids) -> dict:
+        # Entries are shared with the cache; callers treat them as read-only
+        roster = self.recipients.get(env)
+        return {bid: list(roster.get(bid, ())) for bid in building_ids}
+
+    def groupme_ids_by_buildings(self, env, building_ids) -> list:
+        roster = self.recipients.get(env)
+        return [entry['group_id'] for bid in building_ids for entry in roster.get(bid, ())]
+
+    def list_chats(self, env) -> list:
+        return list(self.collection.find({'env': env}, CHAT_LIST_PROJECTION))
+
+    def set_chats_active(self, env, groupme_ids, active, reason=None) -> int:
+        groupme_ids = list(groupme_ids)
+        if not groupme_ids:
+            return 0
+        fields = {'active': active, 'inactive_reason': None if active else reason}
+        result = self.collection.update_many(
+            {'env': env, 'groupme_id': {'$in': groupme_ids}, 'active': {'$ne': active}}, {'$set': fields}
+        )
+        if result.modified_count:
+            self.invalidate_recipients(env)
+        return result.modified_count
+
+
+class SQLiteChatStore:
+    """Chat storage in a local SQLite database file.
+
+    Meant for single-node deployments that want durable storage without
+    running MongoDB. The database runs in WAL mode so readers never block
+    behind the writer. Each thread gets its own connection. Writes are
+    serialized with a lock, and batches go in one transaction.
+
+    ``building_id`` and ``floor_number`` columns have no declared type, so
+    values round-trip exactly as given, matching the MongoDB backend.
+    """
+
+    name = 'sqlite'
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS chats (
+            id INTEGER PRIMARY KEY,
+            env TEXT NOT NULL,
+            groupme_id TEXT NOT NULL,
+            building_id,
+            floor_number,
+            active INTEGER NOT NULL DEFAULT 1,
+            inactive_reason TEXT,
+            UNIQUE (env, groupme_id)
+        )
+        """,
+        # Covers recipient lookups, which skip inactive chats
+        "CREATE INDEX IF NOT EXISTS chats_env_building_active "
+        "ON chats (env, building_id, floor_number, groupme_id, active)",
+        "DROP INDEX IF EXISTS chats_env_building",
+    )
+    # Columns added after the first release, created on databases that predate them
+    MIGRATIONS = {
+        'active': 'ALTER TABLE chats ADD COLUMN active INTEGER NOT NULL DEFAULT 1',
+        'inactive_reason': 'ALTER TABLE chats ADD COLUMN inactive_reason TEXT',
+    }
+
+    def __init__(self, path: str = 'rhac.sqlite3'):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            conn.execute(self.SCHEMA[0])
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(chats)')}
+            for column, statement in self.MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(statement)
+            for statement in self.SCHEMA[1:]:
+                conn.execute(statement)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            # WAL makes NORMAL durable across application crashes; only an OS crash can lose the last commits
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row_to_chat(row) -> dict:
+        chat_id, env, groupme_id, building_id, floor_number, active = row
+        return {
+            '_id': str(chat_id),
+            'groupme_id': groupme_id,
+            'building_id': building_id,
+            'floor_number': floor_number,
+            'env': env,
+            'active': bool(active),
+        }
+
+    def find_chat(self, env, groupme_id):
+        row = self._conn().execute(
+            'SELECT id, env, groupme_id, building_id, floor_number, active FROM chats WHERE env = ? AND groupme_id = ?',
+            (env, groupme_id),
+        ).fetchone()
+        return self._row_to_chat(row) if row else None
+
+    def _existing_ids(self, conn, env, groupme_ids) -> set:
+        groupme_ids = list(groupme_ids)
+        found = set()
+        for start in range(0, len(groupme_ids), 500):
+            batch = groupme_ids[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(
+                f'SELECT groupme_id FROM chats WHERE env = ? AND groupme_id IN ({placeholders})',
+                (env, *batch),
+            )
+            found.update(row[0] for row in rows)
+        return found
+
+    def existing_groupme_ids(self, env, groupme_ids) -> set:
+        return self._existing_ids(self._conn(), env, groupme_ids)
+
+    def add_chat(self, chat) -> dict:
+        conn = self._conn()
+        try:
+            with self._write_lock, conn:
+                cursor = conn.execute(
+                    'INSERT INTO chats (env, groupme_id, building_id, floor_number, active) VALUES (?, ?, ?, ?, ?)',
+                    (chat.get('env'), chat['groupme_id'], chat['building_id'], chat['floor_number'],
+                     int(chat.get('active', True))),
+                )
+        except sqlite3.IntegrityError:
+            raise DuplicateChatError(chat['groupme_id'])
+        return {'active': True, **chat, '_id': str(cursor.lastrowid)}
+
+    def add_chats(self, chats) -> list:
+        """Insert several chats in one transaction. Returns the stored chat, or None for a duplicate, per input."""
+        chats = list(chats)
+        if not chats:
+            return []
+        conn = self._conn()
+        with self._write_lock, conn:
+            seen = set()
+            for env in {chat.get('env') for chat in chats}:
+                ids = [chat['groupme_id'] for chat in chats if chat.get('env') == env]
+                seen.update((env, gid) for gid in self._existing_ids(conn, env, ids))
+            results = []
+            to_insert = []
+            for chat in chats:
+                key = (chat.get('env'), chat['groupme_id'])
+                if key in seen:
+                    results.append(None)
+                    continue
+                seen.add(key)
+                results.append({'active': True, **chat})
+                to_insert.append((chat.get('env'), chat['groupme_id'], chat['building_id'], chat['floor_number'],
+                                  int(chat.get('active', True))))
+            conn.executemany(
+                'INSERT INTO chats (env, groupme_id, building_id, floor_number, active) VALUES (?, ?, ?, ?, ?)',
+                to_insert,
+            )
+        return results
+
+    def _select_by_buildings(self, env, building_ids):
+        building_ids = list(building_ids)
+        conn = self._conn()
+        for start in range(0, len(building_ids), 500):
+            batch = building_ids[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            yield from conn.execute(
+                'SELECT building_id, groupme_id, floor_number FROM chats '
+                f'WHERE env = ? AND building_id IN ({placeholders}) AND active = 1 ORDER BY id',
+                (env, *batch),
+            )
+
+    def map_by_buildings(self, env, building_ids) -> dict:
+        mapping = {bid: [] for bid in building_ids}
+        for building_id, groupme_id, floor_number in self._select_by_buildings(env, mapping):
+            mapping[building_id].append(_group_entry(groupme_id, floor_number))
+        return mapping
+
+    def groupme_ids_by_buildings(self, env, building_ids) -> list:
+        mapping = self.map_by_buildings(env, building_ids)
+        return [entry['group_id'] for entries in mapping.values() for entry in entries]
+
+    def list_chats(self, env) -> list:
+        rows = self._conn().execute(
+            'SELECT groupme_id, building_id, floor_number, active, inactive_reason FROM chats WHERE env = ? ORDER BY id',
+            (env,),
+        )
+        return [
+            {'groupme_id': gid, 'building_id': bid, 'floor_number': floor, 'env': env,
+             'active': bool(active), 'inactive_reason': reason}
+            for gid, bid, floor, active, reason in rows
+        ]
+
+    def set_chats_active(self, env, groupme_ids, active, reason=None) -> int:
+        groupme_ids = list(groupme_ids)
+        conn = self._conn()
+        changed = 0
+        with self._write_lock, conn:
+            for start in range(0, len(groupme_ids), 500):
+                batch = groupme_ids[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                cursor = conn.execute(
+                    'UPDATE chats SET active = ?, inactive_reason = ? '
+                    f'WHERE env = ? AND active != ? AND groupme_id IN ({placeholders})',
+                    (int(active), None if active else reason, env, int(active), *batch),
+                )
+                changed += cursor.rowcount
+        return changed
+
+
+def create_chat_store(backend, *, db=None, sqlite_path='rhac.sqlite3', cache_ttl=300.0, version_check_interval=5.0):
+    """Build the chat store named by ``backend`` ('mongo', 'sqlite' or 'memory')."""
+    backend = (backend or 'memory').lower()
+    if backend == 'mongo':
+        if db is None:
+            raise ValueError("The mongo storage backend needs a database handle")
+        return MongoChatStore(db, cache_ttl=cache_ttl, version_check_interval=version_check_interval)
+    if backend == 'sqlite':
+        return SQLiteChatStore(sqlite_path)
+    if backend == 'memory':
+        return MemoryChatStore()
+    raise ValueError(f"Unknown storage backend: {backend}")
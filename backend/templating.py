@@ -0,0 +1,42 @@
+# templating.py
+import re
+
+# Placeholders a broadcast message may use, filled per recipient group
+PLACEHOLDERS = ('building_name', 'building_id', 'floor_number', 'region', 'address')
+
+_PLACEHOLDER_RE = re.compile(r'\{(' + '|'.join(PLACEHOLDERS) + r')\}')
+
+
+class MessageTemplate:
+    """A broadcast message compiled once and rendered for each recipient group.
+
+    Only the exact ``{name}`` placeholders in ``PLACEHOLDERS`` are substituted;
+    any other braces are left as they are, so messages written before templating
+    existed are sent unchanged. A message without placeholders is ``static`` and
+    renders to the original string without any work per group.
+
+    Rendering is memoized per distinct context, so the groups of a building that
+    share a floor (or a static-per-building template) cost one render between them.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        # re.split with one capture group alternates literal text and placeholder names
+        parts = _PLACEHOLDER_RE.split(source)
+        self._literals = parts[0::2]
+        self.fields = tuple(parts[1::2])
+        self.static = not self.fields
+        self._rendered = {}
+
+    def render(self, context: dict) -> str:
+        if self.static:
+            return self.source
+        key = tuple(context.get(name) for name in self.fields)
+        text = self._rendered.get(key)
+        if text is None:
+            out = [self._literals[0]]
+            for value, literal in zip(key, self._literals[1:]):
+                out.append('' if value is None else str(value))
+                out.append(literal)
+            text = self._rendered[key] = ''.join(out)
+        return text